@@ -0,0 +1,36 @@
+import logging
+
+from configmanager.core.utils import get_target_class_from_config
+
+from minimamba.configs.models import ExportCommandConfig
+from minimamba.models.nn_model import NNModel
+from minimamba.models.step_decoder import export_decoder
+
+logger = logging.getLogger(__name__)
+
+
+def main(config: ExportCommandConfig):
+    """Export the single token decoder of Mamba with torch.export.
+
+    The exported program can be run with minimamba.deploy.exported_decoder,
+    that only depends on torch.
+
+    Args:
+        config (ExportCommandConfig): config object
+        defined into minimamba.config.models and that
+        inherits from BaseCommandConfig
+    """
+    logger.info("Running %s", __name__)
+
+    # Create the NN
+    logger.info("Create NN")
+    nn_model: NNModel = get_target_class_from_config(
+        config.nn_config
+    ).load_from_checkpoint(config.path_pretrained, config=config.nn_config)
+    nn_model = nn_model.eval()
+
+    logger.info("Export decoder")
+    export_decoder(nn_model, config.path_export, config.batch_size)
+    logger.info("Decoder exported to %s", config.path_export)
+
+    logger.info("Done")
@@ -1,13 +1,23 @@
+import json
 import logging
+import time
+from typing import Optional, Union
+
 import torch
 from configmanager.core.utils import get_target_class_from_config
 import torch.utils
 import torch.utils.data
-import os
-import requests
 
-from minimamba.configs.models import GenerateCommandConfig
+from minimamba.configs.models import GenerateCommandConfig, NNConfig, SamplingConfig
+from minimamba.generation.batch_generator import BatchGenerator, GenerationRequest
+from minimamba.generation.beam_search import BeamSearchGenerator
+from minimamba.generation.prefix_cache import PrefixStateCache
+from minimamba.generation.speculative import SpeculativeGenerator
+from minimamba.generation.streaming import stream_generate
+from minimamba.generation.tokenizer import CharTokenizer, load_shakespeare_tokenizer
 from minimamba.models.nn_model import NNModel
+from minimamba.models.quantization import quantize_dynamic_int8
+from minimamba.utils.global_context import GlobalContextManager
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +25,13 @@ logger = logging.getLogger(__name__)
 def main(config: GenerateCommandConfig):
     """Generate some sample data with Mamba.
 
+    Without a prompts file a single sample is logged, otherwise all the prompts
+    are completed in batches and saved as generations.jsonl in the
+    serialization dir. With a draft model the tokens are generated with
+    speculative decoding, and its acceptance rate is logged. Beam search
+    replaces sampling if configured. In stream mode the single sample is printed
+    while it is generated, without compile or prefix cache.
+
     A command must receive a single config object as argument.
 
     Args:
@@ -23,52 +40,192 @@ def main(config: GenerateCommandConfig):
         inherits from BaseCommandConfig
     """
     logger.info("Running %s", __name__)
+    # Invalid combinations fail before any model is loaded
+    _check_modes(config)
 
     # Create the NN
     logger.info("Create NN")
-    nn_model: NNModel = get_target_class_from_config(
-        config.nn_config
-    ).load_from_checkpoint(config.path_pretrained, config=config.nn_config)
-    nn_model = nn_model.eval()
+    nn_model = _load_model(config.nn_config, config.path_pretrained, config.quantize)
 
-    input_file_path = "/tmp/file.txt"
-    if not os.path.exists(input_file_path):
-        data_url = "https://raw.githubusercontent.com/karpathy/char-rnn/master/data/tinyshakespeare/input.txt"
-        with open(input_file_path, "w") as f:
-            f.write(requests.get(data_url).text)
-
-    with open(input_file_path, "r") as f:
-        data = f.read()
-
-    # get all the unique characters that occur in this text
-    chars = sorted(list(set(data)))
-
-    # create a mapping from characters to integers
-    stoi = {ch: i for i, ch in enumerate(chars)}
-    itos = {i: ch for i, ch in enumerate(chars)}
-
-    def encode(s):
-        return [stoi[c] for c in s]  # encoder: take a string, output a list of integers
-
-    def decode(l):
-        return "".join(
-            [itos[i] for i in l]
-        )  # decoder: take a list of integers, output a string
-
-    input_str = "Hello,"
-    input_idx = torch.tensor(encode(input_str)).unsqueeze(0).to(nn_model.device)
-
-    for i in range(50):
-        out = nn_model(input_idx)
-        next_token_idx = out[0, -1].argmax().item()
-        input_idx = torch.cat(
-            [
-                input_idx,
-                torch.tensor([next_token_idx]).unsqueeze(0).to(input_idx.device),
-            ],
-            -1,
+    tokenizer = load_shakespeare_tokenizer()
+    prefix_cache = None
+    if config.prefix_cache is not None:
+        prefix_cache = PrefixStateCache(
+            config.prefix_cache.max_megabytes * 2**20, config.prefix_cache.block_size
+        )
+    # In stream mode the sample is decoded by stream_generate
+    generator = None
+    if not config.stream:
+        generator = _create_generator(config, nn_model, tokenizer, prefix_cache)
+
+    if config.path_prompts is None:
+        requests = [GenerationRequest("Hello,", config.max_new_tokens, config.stop)]
+    else:
+        requests = _load_requests(config)
+        logger.info("Loaded %d prompts from %s", len(requests), config.path_prompts)
+
+    # Linear projections in bfloat16, the SSM recurrence stays in fp32
+    autocast = torch.autocast(
+        device_type=nn_model.device.type,
+        dtype=torch.bfloat16,
+        enabled=config.precision == "bf16-mixed",
+    )
+    start = time.perf_counter()
+    with autocast:
+        if config.stream:
+            completions = [
+                _stream(nn_model, tokenizer, requests[0], config.sampling, start)
+            ]
+        else:
+            completions = generator.generate(requests)
+    elapsed = time.perf_counter() - start
+
+    num_tokens = sum(len(tokenizer.encode(completion)) for completion in completions)
+    logger.info("Generated %d tokens, %.1f tokens/sec", num_tokens, num_tokens / elapsed)
+    if config.speculative is not None:
+        logger.info(
+            "Acceptance rate of the draft tokens: %.3f", generator.acceptance_rate
         )
-    output_str = decode(input_idx[0].tolist())
-    logger.info("Produced the following string: %s", output_str)
+    if prefix_cache is not None:
+        logger.info(
+            "Prefix cache: %d hits, %d misses", prefix_cache.hits, prefix_cache.misses
+        )
+
+    if config.path_prompts is None:
+        output_str = requests[0].prompt + completions[0]
+        logger.info("Produced the following string: %s", output_str)
+    else:
+        _save_generations(requests, completions)
 
     logger.info("Done")
+
+
+def _check_modes(config: GenerateCommandConfig) -> None:
+    if config.beam_search is not None and (
+        config.sampling is not None or config.speculative is not None
+    ):
+        raise ValueError("Beam search can not be combined with sampling or a draft model")
+    if config.speculative is not None and config.sampling is not None:
+        raise ValueError("Speculative decoding only supports greedy decoding")
+    if config.prefix_cache is not None and (
+        config.beam_search is not None or config.speculative is not None
+    ):
+        raise ValueError("The prefix cache is not used by beam search or a draft model")
+    if config.stream and (
+        config.path_prompts is not None
+        or config.speculative is not None
+        or config.beam_search is not None
+        or config.compile is not None
+        or config.prefix_cache is not None
+    ):
+        raise ValueError(
+            "Streaming is only available for a single prompt, without a draft model, "
+            "beam search, compile or prefix cache"
+        )
+
+
+def _load_model(nn_config: NNConfig, path_pretrained: str, quantize: bool) -> NNModel:
+    nn_model: NNModel = get_target_class_from_config(nn_config).load_from_checkpoint(
+        path_pretrained, config=nn_config
+    )
+    nn_model = nn_model.eval()
+    if quantize:
+        logger.info("Quantize the linear layers to int8")
+        nn_model = quantize_dynamic_int8(nn_model)
+
+    return nn_model
+
+
+def _create_generator(
+    config: GenerateCommandConfig,
+    nn_model: NNModel,
+    tokenizer: CharTokenizer,
+    prefix_cache: Optional[PrefixStateCache],
+) -> Union[BatchGenerator, BeamSearchGenerator]:
+    # In stream mode the generator only decides how the sample is decoded
+    if config.beam_search is not None:
+        return BeamSearchGenerator(
+            nn_model,
+            tokenizer,
+            config.beam_search.num_beams,
+            config.beam_search.length_penalty,
+            config.beam_search.early_stopping,
+            config.compile,
+        )
+    if config.speculative is not None:
+        logger.info("Create draft NN")
+        draft_model = _load_model(
+            config.speculative.nn_config,
+            config.speculative.path_pretrained,
+            config.quantize,
+        )
+        return SpeculativeGenerator(
+            nn_model,
+            draft_model,
+            tokenizer,
+            config.speculative.num_draft_tokens,
+            config.batch_size,
+            config.compile,
+        )
+
+    return BatchGenerator(
+        nn_model,
+        tokenizer,
+        config.batch_size,
+        config.compile,
+        config.sampling,
+        config.sync_interval,
+        prefix_cache,
+    )
+
+
+def _save_generations(requests: list[GenerationRequest], completions: list[str]) -> None:
+    path_output = (
+        GlobalContextManager().get_global_context().path_serialization_dir
+        / "generations.jsonl"
+    )
+    with open(path_output, "w") as f:
+        for request, completion in zip(requests, completions):
+            line = {"prompt": request.prompt, "completion": completion}
+            f.write(json.dumps(line) + "\n")
+    logger.info("Generations saved to %s", path_output)
+
+
+def _load_requests(config: GenerateCommandConfig) -> list[GenerationRequest]:
+    requests = []
+    with open(config.path_prompts, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            requests.append(
+                GenerationRequest(
+                    item["prompt"],
+                    item.get("max_new_tokens", config.max_new_tokens),
+                    item.get("stop", config.stop),
+                )
+            )
+
+    return requests
+
+
+def _stream(
+    model: NNModel,
+    tokenizer: CharTokenizer,
+    request: GenerationRequest,
+    sampling: Optional[SamplingConfig],
+    start: float,
+) -> str:
+    print(request.prompt, end="", flush=True)
+    pieces = []
+    for piece in stream_generate(model, tokenizer, request, sampling):
+        if not pieces:
+            time_to_first_token = time.perf_counter() - start
+        print(piece, end="", flush=True)
+        pieces.append(piece)
+    print()
+
+    if pieces:
+        logger.info("Time to first token: %.1f ms", time_to_first_token * 1000)
+
+    return "".join(pieces)
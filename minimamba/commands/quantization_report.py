@@ -0,0 +1,101 @@
+import json
+import logging
+import time
+from itertools import islice
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+import torch.utils
+import torch.utils.data
+from configmanager.core.utils import create_obj_from_config, get_target_class_from_config
+
+from minimamba.configs.models import QuantizationReportCommandConfig
+from minimamba.models.mini_mamba import MiniMamba
+from minimamba.models.quantization import quantize_dynamic_int8
+from minimamba.utils.global_context import GlobalContextManager
+
+logger = logging.getLogger(__name__)
+
+
+def main(config: QuantizationReportCommandConfig):
+    """Compare perplexity and speed of Mamba in fp32 and with int8 linear layers.
+
+    The report is logged and saved as quantization_report.json in the
+    serialization dir.
+
+    Args:
+        config (QuantizationReportCommandConfig): config object
+        defined into minimamba.config.models and that
+        inherits from BaseCommandConfig
+    """
+    logger.info("Running %s", __name__)
+
+    # Create the NN
+    logger.info("Create NN")
+    nn_model: MiniMamba = get_target_class_from_config(
+        config.nn_config
+    ).load_from_checkpoint(config.path_pretrained, config=config.nn_config)
+    nn_model = nn_model.eval()
+    models = {"fp32": nn_model, "int8": quantize_dynamic_int8(nn_model)}
+
+    # The same validation batches are used for both the models
+    logger.info("Load validation batches")
+    np.random.seed(0)
+    dataset_val: torch.utils.data.Dataset = create_obj_from_config(config.val_config)
+    batches = list(
+        islice(
+            torch.utils.data.DataLoader(dataset_val, config.batch_size),
+            config.num_batches,
+        )
+    )
+
+    report = {}
+    for name, model in models.items():
+        report[name] = {
+            "perplexity": _perplexity(model, batches),
+            "tokens_per_sec": _tokens_per_sec(
+                model, config.batch_size, config.num_tokens
+            ),
+        }
+        logger.info(
+            "%s: perplexity %.3f, %.1f tokens/sec",
+            name,
+            report[name]["perplexity"],
+            report[name]["tokens_per_sec"],
+        )
+
+    path_report = (
+        GlobalContextManager().get_global_context().path_serialization_dir
+        / "quantization_report.json"
+    )
+    with open(path_report, "w") as f:
+        json.dump(report, f, indent=4)
+    logger.info("Report saved to %s", path_report)
+
+    logger.info("Done")
+
+
+@torch.no_grad()
+def _perplexity(
+    model: MiniMamba, batches: list[tuple[torch.tensor, torch.tensor]]
+) -> float:
+    losses = [
+        F.cross_entropy(model(x).flatten(0, 1), y.flatten(), ignore_index=-1)
+        for x, y in batches
+    ]
+    return torch.stack(losses).mean().exp().item()
+
+
+@torch.no_grad()
+def _tokens_per_sec(model: MiniMamba, batch_size: int, num_tokens: int) -> float:
+    # Greedy decoding with the recurrent step, starting from empty sequences
+    states = model.init_states(batch_size)
+    idx = torch.zeros(batch_size, dtype=torch.long)
+    start = time.perf_counter()
+    for _ in range(num_tokens):
+        logits, states = model.step(idx, states)
+        idx = logits.argmax(-1)
+    elapsed = time.perf_counter() - start
+
+    return batch_size * num_tokens / elapsed
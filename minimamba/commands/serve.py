@@ -0,0 +1,89 @@
+import asyncio
+import logging
+from typing import AsyncIterator
+
+from aiohttp import web
+from configmanager.core.utils import get_target_class_from_config
+
+from minimamba.configs.models import ServeCommandConfig
+from minimamba.generation.batch_generator import GenerationRequest
+from minimamba.generation.prefix_cache import PrefixStateCache
+from minimamba.generation.scheduler import ContinuousBatchScheduler
+from minimamba.generation.tokenizer import load_shakespeare_tokenizer
+from minimamba.models.nn_model import NNModel
+from minimamba.models.quantization import quantize_dynamic_int8
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_KEY = web.AppKey("scheduler", ContinuousBatchScheduler)
+
+
+def main(config: ServeCommandConfig):
+    """Serve Mamba over HTTP on localhost, with continuous batching.
+
+    POST /generate with {"prompt": ..., "max_new_tokens": ..., "stop": [...]}
+    returns {"completion": ..., "num_tokens": ...}. All the running requests are
+    decoded as a single batch, that new requests join at every step.
+
+    Args:
+        config (ServeCommandConfig): config object
+        defined into minimamba.config.models and that
+        inherits from BaseCommandConfig
+    """
+    logger.info("Running %s", __name__)
+
+    # Create the NN
+    logger.info("Create NN")
+    nn_model: NNModel = get_target_class_from_config(
+        config.nn_config
+    ).load_from_checkpoint(config.path_pretrained, config=config.nn_config)
+    nn_model = nn_model.eval()
+    if config.quantize:
+        logger.info("Quantize the linear layers to int8")
+        nn_model = quantize_dynamic_int8(nn_model)
+
+    tokenizer = load_shakespeare_tokenizer()
+    prefix_cache = None
+    if config.prefix_cache is not None:
+        prefix_cache = PrefixStateCache(
+            config.prefix_cache.max_megabytes * 2**20, config.prefix_cache.block_size
+        )
+
+    async def run_scheduler(app: web.Application) -> AsyncIterator[None]:
+        # The scheduler is created inside the event loop of the server
+        app[SCHEDULER_KEY] = ContinuousBatchScheduler(
+            nn_model, tokenizer, config.max_batch_size, config.sampling, prefix_cache
+        )
+        task = asyncio.create_task(app[SCHEDULER_KEY].run())
+        yield
+        task.cancel()
+        if prefix_cache is not None:
+            logger.info(
+                "Prefix cache: %d hits, %d misses",
+                prefix_cache.hits,
+                prefix_cache.misses,
+            )
+
+    app = web.Application()
+    app.cleanup_ctx.append(run_scheduler)
+    app.router.add_post("/generate", _generate)
+
+    logger.info("Serving on http://%s:%d", config.host, config.port)
+    web.run_app(app, host=config.host, port=config.port, print=None)
+
+    logger.info("Done")
+
+
+async def _generate(request: web.Request) -> web.Response:
+    try:
+        body = await request.json()
+        generation_request = GenerationRequest(
+            body["prompt"], body.get("max_new_tokens", 50), body.get("stop", [])
+        )
+        result = await request.app[SCHEDULER_KEY].submit(generation_request)
+    except (ValueError, KeyError, TypeError) as e:
+        raise web.HTTPBadRequest(text=str(e))
+
+    return web.json_response(
+        {"completion": result.completion, "num_tokens": result.num_tokens}
+    )
@@ -9,6 +9,7 @@ import torch.utils.data
 
 from minimamba.configs.models import TrainCommandConfig
 from minimamba.models.nn_model import NNModel
+from minimamba.utils.compile import compile_if_configured
 
 logger = logging.getLogger(__name__)
 
@@ -48,6 +49,7 @@ def main(config: TrainCommandConfig):
     # Create the NN
     logger.info("Create NN")
     nn_model: NNModel = create_obj_from_config(config.nn_config)
+    nn_model = compile_if_configured(nn_model, config.compile)
 
     # Train
     wandb_logger = WandbLogger(log_model="all")
@@ -63,6 +65,7 @@ def main(config: TrainCommandConfig):
         log_every_n_steps=config.batch_size,
         logger=wandb_logger,
         callbacks=[checkpoint_callback],
+        precision=config.precision,
     )
     trainer.fit(nn_model, dataloader_train, dataloader_val)
 
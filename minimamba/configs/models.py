@@ -6,9 +6,9 @@
 
 from pathlib import Path
 
-from typing import List, Optional
+from typing import List, Literal, Optional, Union
 from configmanager.core.models import BaseConfig, BaseObjectConfig, BaseCommandConfig
-from pydantic import StrictStr, StrictInt, StrictFloat
+from pydantic import Field, StrictBool, StrictStr, StrictInt, StrictFloat, model_validator
 
 
 # DO NOT DELETE
@@ -29,13 +29,42 @@ class MiniMambaBlockConfig(BaseConfig):
     state_dim: StrictInt
     fraction_d: StrictInt
     layer_out: Optional[StrictInt] = None
+    scan_mode: Literal[
+        "sequential", "parallel", "chunked", "recompute", "segsum", "fused"
+    ] = "sequential"
+    chunk_size: StrictInt = 64
+    checkpoint: StrictBool = False
+    fused_ops: StrictBool = False
+
+
+class MiniMambaSSDBlockConfig(BaseConfig):
+    layer_input: StrictInt
+    expansion: StrictInt
+    conv_kernel: StrictInt
+    state_dim: StrictInt
+    head_dim: StrictInt
+    chunk_size: StrictInt = 64
+    layer_out: Optional[StrictInt] = None
+    checkpoint: StrictBool = False
+    fused_ops: StrictBool = False
+
+    @model_validator(mode="after")
+    def check_head_dim(self) -> "MiniMambaSSDBlockConfig":
+        # The working dim is split into heads of head_dim channels
+        if (self.layer_input * self.expansion) % self.head_dim != 0:
+            raise ValueError(
+                f"head_dim {self.head_dim} does not divide the working dim "
+                f"{self.layer_input * self.expansion}"
+            )
+        return self
 
 
 class MiniMambaConfig(NNConfig):
-    blocks: List[MiniMambaBlockConfig]
+    blocks: List[Union[MiniMambaBlockConfig, MiniMambaSSDBlockConfig]]
     lr: StrictFloat
     embedding_dim: StrictInt
     vocab_size: StrictInt
+    loss_chunk_size: Optional[StrictInt] = None
 
 
 class DatasetConfig(BaseObjectConfig):
@@ -44,6 +73,43 @@ class DatasetConfig(BaseObjectConfig):
     epoch_length: StrictInt
 
 
+# The "sequential" and "fused" scans loop over the time steps in Python and are
+# unrolled over the whole sequence, training rejects them when compiling
+class CompileConfig(BaseConfig):
+    backend: StrictStr = "inductor"
+    mode: Optional[StrictStr] = None
+    fullgraph: StrictBool = False
+
+
+class SamplingConfig(BaseConfig):
+    # 0 means greedy decoding
+    temperature: StrictFloat = 1.0
+    top_k: Optional[StrictInt] = None
+    top_p: Optional[StrictFloat] = None
+    repetition_penalty: StrictFloat = 1.0
+    seed: Optional[StrictInt] = None
+
+
+class PrefixCacheConfig(BaseConfig):
+    max_megabytes: StrictInt = 256
+    # Prefixes are cached every block_size tokens
+    block_size: StrictInt = 64
+
+
+class BeamSearchConfig(BaseConfig):
+    num_beams: StrictInt = 4
+    # Scores are divided by length ** length_penalty
+    length_penalty: StrictFloat = 1.0
+    early_stopping: StrictBool = False
+
+
+class SpeculativeConfig(BaseConfig):
+    # Draft model, with the same vocabulary of the main one
+    nn_config: NNConfig
+    path_pretrained: StrictStr
+    num_draft_tokens: StrictInt = 4
+
+
 class TrainCommandConfig(BaseCommandConfig):
     batch_size: StrictInt
     num_epochs: StrictInt
@@ -51,8 +117,69 @@ class TrainCommandConfig(BaseCommandConfig):
     nn_config: NNConfig
     train_config: DatasetConfig
     val_config: DatasetConfig
+    compile: Optional[CompileConfig] = None
+    precision: Literal["32-true", "bf16-mixed"] = "32-true"
+
+    @model_validator(mode="after")
+    def check_compiled_scan_modes(self) -> "TrainCommandConfig":
+        if self.compile is None:
+            return self
+        for block in getattr(self.nn_config, "blocks", []):
+            if getattr(block, "scan_mode", None) in ("sequential", "fused"):
+                raise ValueError(
+                    f'scan_mode "{block.scan_mode}" can not be compiled for training, '
+                    'use "parallel", "chunked", "recompute" or "segsum"'
+                )
+        return self
 
 
 class GenerateCommandConfig(BaseCommandConfig):
     nn_config: NNConfig
     path_pretrained: StrictStr
+    compile: Optional[CompileConfig] = None
+    precision: Literal["32-true", "bf16-mixed"] = "32-true"
+    quantize: StrictBool = False
+    # JSON lines file with a "prompt" per line, optionally with its own
+    # "max_new_tokens" and "stop" strings
+    path_prompts: Optional[StrictStr] = None
+    max_new_tokens: StrictInt = 50
+    stop: List[StrictStr] = Field(default_factory=list)
+    batch_size: StrictInt = 32
+    # Greedy decoding if None
+    sampling: Optional[SamplingConfig] = None
+    # Generated tokens are copied to the host every sync_interval steps
+    sync_interval: StrictInt = 16
+    # Greedy speculative decoding with a draft model if given
+    speculative: Optional[SpeculativeConfig] = None
+    # Print the single sample while it is generated
+    stream: StrictBool = False
+    prefix_cache: Optional[PrefixCacheConfig] = None
+    beam_search: Optional[BeamSearchConfig] = None
+
+
+class ServeCommandConfig(BaseCommandConfig):
+    nn_config: NNConfig
+    path_pretrained: StrictStr
+    host: StrictStr = "127.0.0.1"
+    port: StrictInt = 8080
+    max_batch_size: StrictInt = 32
+    quantize: StrictBool = False
+    # Greedy decoding if None
+    sampling: Optional[SamplingConfig] = None
+    prefix_cache: Optional[PrefixCacheConfig] = None
+
+
+class ExportCommandConfig(BaseCommandConfig):
+    nn_config: NNConfig
+    path_pretrained: StrictStr
+    path_export: StrictStr
+    batch_size: StrictInt = 1
+
+
+class QuantizationReportCommandConfig(BaseCommandConfig):
+    nn_config: NNConfig
+    path_pretrained: StrictStr
+    val_config: DatasetConfig
+    batch_size: StrictInt
+    num_batches: StrictInt
+    num_tokens: StrictInt
@@ -0,0 +1,87 @@
+import json
+
+import torch
+
+# Name of the file with the state shapes, stored inside the exported program
+METADATA_FILE = "metadata.json"
+
+
+class ExportedDecoder:
+    """Run the single token decoder written by the export command
+
+    Only torch is needed: the program already contains the embedding, the
+    projection, the step of every block and the head, the recurrent states are
+    passed explicitly as a list of tensors (conv and ssm state of each block).
+
+    Args:
+        path (str): path of the exported program
+    """
+
+    def __init__(self, path: str) -> None:
+        extra_files = {METADATA_FILE: ""}
+        program = torch.export.load(path, extra_files=extra_files)
+        metadata: dict = json.loads(extra_files[METADATA_FILE])
+
+        self._decoder = program.module()
+        self._state_shapes: list[tuple] = [
+            tuple(shape) for shape in metadata["state_shapes"]
+        ]
+        self._state_dtype: torch.dtype = getattr(torch, metadata["state_dtype"])
+        self.batch_size: int = metadata["batch_size"]
+
+    def init_states(self) -> list[torch.tensor]:
+        """Create the states of empty sequences
+
+        Returns:
+            list[torch.tensor]: zero states
+        """
+        return [
+            torch.zeros(shape, dtype=self._state_dtype) for shape in self._state_shapes
+        ]
+
+    def step(
+        self, idx: torch.tensor, states: list[torch.tensor]
+    ) -> tuple[torch.tensor, list[torch.tensor]]:
+        """Process a single token per sequence
+
+        Args:
+            idx (torch.tensor): last token of each sequence, shape (B,)
+            states (list[torch.tensor]): states after the previous tokens
+
+        Returns:
+            tuple[torch.tensor, list[torch.tensor]]: logits of the next token (B, V)
+            and the updated states
+        """
+        logits, states = self._decoder(idx, states)
+        return logits, list(states)
+
+    @torch.no_grad()
+    def generate(self, prompt_idx: torch.tensor, max_new_tokens: int) -> torch.tensor:
+        """Greedy generation
+
+        Args:
+            prompt_idx (torch.tensor): prompts, shape (B, T)
+            max_new_tokens (int): number of tokens to be generated
+
+        Returns:
+            torch.tensor: prompts followed by the new tokens, shape (B, T + new)
+
+        Raises:
+            ValueError: if the prompts are empty
+        """
+        if prompt_idx.shape[1] == 0:
+            raise ValueError("The prompts must contain at least one token")
+
+        states = self.init_states()
+        for t in range(prompt_idx.shape[1]):
+            logits, states = self.step(prompt_idx[:, t], states)
+
+        output_idx = [prompt_idx]
+        for i in range(max_new_tokens):
+            next_idx = logits.argmax(-1)
+            output_idx.append(next_idx.unsqueeze(1))
+            # The logits after the last token are not needed
+            if i + 1 < max_new_tokens:
+                logits, states = self.step(next_idx, states)
+
+        return torch.cat(output_idx, 1)
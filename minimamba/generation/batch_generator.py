@@ -0,0 +1,255 @@
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import torch
+
+from minimamba.configs.models import CompileConfig, SamplingConfig
+from minimamba.generation.prefix_cache import PrefixStateCache
+from minimamba.generation.sampling import sample, token_presence
+from minimamba.generation.tokenizer import CharTokenizer
+from minimamba.models.mini_mamba import (
+    MambaBlockState,
+    MiniMamba,
+    cat_states,
+    select_states,
+)
+from minimamba.utils.compile import compile_if_configured
+
+
+@dataclass
+class GenerationRequest:
+    """A prompt to be completed
+
+    Args:
+        prompt (str): text to be continued, at least one token
+        max_new_tokens (int): maximum number of generated tokens
+        stop (list[str]): the generation ends as soon as one of these strings is
+            produced, the stop string is not part of the completion
+    """
+
+    prompt: str
+    max_new_tokens: int
+    stop: list[str] = field(default_factory=list)
+
+
+class BatchGenerator:
+    """Generation of many prompts at once
+
+    Prompts are sorted by length, so that each batch is prefilled with a few
+    forward calls. The sequences that are done leave the batch together with
+    their recurrent states, every step only runs the unfinished ones.
+
+    Sampling runs on the device and the new tokens are written into a
+    preallocated buffer, which is copied to the host every sync_interval steps:
+    stop strings are detected at these copies, sequences may run for at most
+    sync_interval - 1 extra steps before leaving the batch.
+
+    Args:
+        model (MiniMamba): language model in eval mode
+        tokenizer (CharTokenizer): tokenizer of the model
+        batch_size (int): maximum number of sequences decoded together
+        compile (Optional[CompileConfig]): if given, forward and step are compiled
+        sampling (Optional[SamplingConfig]): how tokens are sampled, greedy if None
+        sync_interval (int): number of steps between two copies to the host
+        prefix_cache (Optional[PrefixStateCache]): if given, prompts resume from
+            the states of their longest cached prefix
+    """
+
+    def __init__(
+        self,
+        model: MiniMamba,
+        tokenizer: CharTokenizer,
+        batch_size: int = 32,
+        compile: Optional[CompileConfig] = None,
+        sampling: Optional[SamplingConfig] = None,
+        sync_interval: int = 16,
+        prefix_cache: Optional[PrefixStateCache] = None,
+    ) -> None:
+        self._model = model
+        self._tokenizer = tokenizer
+        self._batch_size = batch_size
+        self._forward = compile_if_configured(model, compile)
+        self._step = compile_if_configured(model.step, compile)
+        self._sampling = sampling
+        self._sync_interval = sync_interval
+        self._prefix_cache = prefix_cache
+        self._generator: Optional[torch.Generator] = None
+        if sampling is not None and sampling.seed is not None:
+            self._generator = torch.Generator(model.device).manual_seed(sampling.seed)
+
+    @torch.no_grad()
+    def generate(self, requests: list[GenerationRequest]) -> list[str]:
+        """Complete the prompts
+
+        Args:
+            requests (list[GenerationRequest]): prompts and stopping criteria
+
+        Returns:
+            list[str]: completion of each request, in the order of requests
+        """
+        prompts = [self._tokenizer.encode(request.prompt) for request in requests]
+        if any(len(prompt) == 0 for prompt in prompts):
+            raise ValueError("Prompts must contain at least one token")
+
+        completions = [""] * len(requests)
+        order = sorted(
+            (i for i, request in enumerate(requests) if request.max_new_tokens > 0),
+            key=lambda i: len(prompts[i]),
+        )
+        for start in range(0, len(order), self._batch_size):
+            batch = order[start : start + self._batch_size]
+            batch_completions = self._generate_batch(
+                [requests[i] for i in batch], [prompts[i] for i in batch]
+            )
+            for i, completion in zip(batch, batch_completions):
+                completions[i] = completion
+
+        return completions
+
+    def _generate_batch(
+        self, requests: list[GenerationRequest], prompts: list[list[int]]
+    ) -> list[str]:
+        logits, states = prefill(
+            self._forward, prompts, self._model.device, self._prefix_cache
+        )
+        device = logits.device
+        max_new_tokens = max(request.max_new_tokens for request in requests)
+        # New tokens stay on the device until the next sync
+        output = torch.empty(
+            len(requests), max_new_tokens, dtype=torch.long, device=device
+        )
+        presence = None
+        if self._sampling is not None and self._sampling.repetition_penalty != 1.0:
+            presence = token_presence(prompts, logits.shape[-1], device)
+
+        texts = [""] * len(requests)
+        stopped = [False] * len(requests)
+        # Requests still being decoded, one per row of the batch
+        active = list(range(len(requests)))
+        # Row of the output buffer of each sequence in the batch
+        rows = torch.arange(len(requests), device=device)
+        num_steps, num_synced = 0, 0
+
+        while True:
+            next_idx = sample(logits, self._sampling, presence, self._generator)
+            output[:, num_steps].index_copy_(0, rows, next_idx)
+            if presence is not None:
+                presence.scatter_(1, next_idx.unsqueeze(1), True)
+            num_steps += 1
+
+            if num_steps - num_synced == self._sync_interval:
+                self._sync(requests, output, num_synced, num_steps, texts, stopped)
+                num_synced = num_steps
+
+            running = [
+                row
+                for row, i in enumerate(active)
+                if not stopped[i] and num_steps < requests[i].max_new_tokens
+            ]
+            if not running:
+                break
+
+            # Finished sequences leave the batch, the next steps only run the others
+            if len(running) < len(active):
+                keep = torch.tensor(running, device=device)
+                next_idx = next_idx.index_select(0, keep)
+                rows = rows.index_select(0, keep)
+                if presence is not None:
+                    presence = presence.index_select(0, keep)
+                states = select_states(states, keep)
+                active = [active[row] for row in running]
+
+            logits, states = self._step(next_idx, states)
+
+        if num_synced < num_steps:
+            self._sync(requests, output, num_synced, num_steps, texts, stopped)
+
+        return texts
+
+    def _sync(
+        self,
+        requests: list[GenerationRequest],
+        output: torch.tensor,
+        start: int,
+        end: int,
+        texts: list[str],
+        stopped: list[bool],
+    ) -> None:
+        # A single copy to the host for the tokens of all the sequences
+        tokens = output[:, start:end].tolist()
+        for i, request in enumerate(requests):
+            if stopped[i] or start >= request.max_new_tokens:
+                continue
+            piece = self._tokenizer.decode(tokens[i][: request.max_new_tokens - start])
+            texts[i], stopped[i] = truncate_at_stop(
+                texts[i] + piece, len(piece), request.stop
+            )
+
+
+def prefill(
+    forward: Callable,
+    prompts: list[list[int]],
+    device: torch.device,
+    prefix_cache: Optional[PrefixStateCache] = None,
+) -> tuple[torch.tensor, list[MambaBlockState]]:
+    """Process prompts of different lengths and get the states at their ends
+
+    Prompts with the same length are processed together, without padding. With
+    a prefix cache each prompt resumes from its longest cached prefix instead.
+
+    Args:
+        forward (Callable): forward of the model, called with prefill=True
+        prompts (list[list[int]]): tokens of each prompt, at least one per prompt
+        device (torch.device): device of the model
+        prefix_cache (Optional[PrefixStateCache]): states of the prompt prefixes
+
+    Returns:
+        tuple[torch.tensor, list[MambaBlockState]]: next token logits (B, V) and
+        states of the layers, in the order of prompts
+    """
+    if prefix_cache is not None:
+        results = [prefix_cache.prefill(forward, prompt, device) for prompt in prompts]
+        logits = torch.cat([prompt_logits for prompt_logits, _ in results])
+        states = cat_states([prompt_states for _, prompt_states in results])
+        return logits, states
+
+    rows, logits, states = [], [], []
+    for length in sorted({len(prompt) for prompt in prompts}):
+        group = [i for i, prompt in enumerate(prompts) if len(prompt) == length]
+        idx = torch.tensor([prompts[i] for i in group], device=device)
+        group_logits, group_states = forward(idx, prefill=True)
+        rows.extend(group)
+        logits.append(group_logits)
+        states.append(group_states)
+
+    # Back to the order of the prompts
+    inverse = torch.argsort(torch.tensor(rows, device=device))
+    logits = torch.cat(logits).index_select(0, inverse)
+    states = select_states(cat_states(states), inverse)
+
+    return logits, states
+
+
+def truncate_at_stop(text: str, piece_length: int, stop: list[str]) -> tuple[str, bool]:
+    """Look for the stop strings after a new piece of text is appended
+
+    Args:
+        text (str): completion so far, ending with the new piece
+        piece_length (int): length of the new piece
+        stop (list[str]): stop strings
+
+    Returns:
+        tuple[str, bool]: text cut before the stop string and whether one was found
+    """
+    # Only the stop strings that end inside the new piece are new, the text is cut
+    # at the first one since a piece can contain several
+    positions = []
+    for stop_str in stop:
+        start = max(0, len(text) - piece_length - len(stop_str) + 1)
+        position = text.find(stop_str, start)
+        if position >= 0:
+            positions.append(position)
+
+    if positions:
+        return text[: min(positions)], True
+    return text, False
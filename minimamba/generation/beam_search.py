@@ -0,0 +1,130 @@
+from typing import Optional
+
+import torch
+
+from minimamba.configs.models import CompileConfig
+from minimamba.generation.batch_generator import GenerationRequest, truncate_at_stop
+from minimamba.generation.tokenizer import CharTokenizer
+from minimamba.models.mini_mamba import MiniMamba, select_states
+from minimamba.utils.compile import compile_if_configured
+
+
+class BeamSearchGenerator:
+    """Beam search, with the beams of a prompt decoded as a batch
+
+    The prompt is processed once and its states are repeated for every beam.
+    After each step the states follow the surviving beams with a single
+    select_states, so no prefix is ever processed again. Hypotheses are ranked
+    by their log probability divided by length ** length_penalty, and they end
+    at max_new_tokens or at a stop string.
+
+    Args:
+        model (MiniMamba): language model in eval mode
+        tokenizer (CharTokenizer): tokenizer of the model
+        num_beams (int): number of beams
+        length_penalty (float): exponent of the length normalization, values > 0
+            favour longer hypotheses
+        early_stopping (bool): stop as soon as num_beams hypotheses are finished,
+            otherwise only when no running beam can beat them
+        compile (Optional[CompileConfig]): if given, forward and step are compiled
+    """
+
+    def __init__(
+        self,
+        model: MiniMamba,
+        tokenizer: CharTokenizer,
+        num_beams: int = 4,
+        length_penalty: float = 1.0,
+        early_stopping: bool = False,
+        compile: Optional[CompileConfig] = None,
+    ) -> None:
+        self._model = model
+        self._tokenizer = tokenizer
+        self._num_beams = num_beams
+        self._length_penalty = length_penalty
+        self._early_stopping = early_stopping
+        self._forward = compile_if_configured(model, compile)
+        self._step = compile_if_configured(model.step, compile)
+
+    @torch.no_grad()
+    def generate(self, requests: list[GenerationRequest]) -> list[str]:
+        """Complete the prompts, one after the other
+
+        Args:
+            requests (list[GenerationRequest]): prompts and stopping criteria
+
+        Returns:
+            list[str]: best hypothesis of each request, in the order of requests
+        """
+        return [self._search(request) for request in requests]
+
+    def _search(self, request: GenerationRequest) -> str:
+        prompt = self._tokenizer.encode(request.prompt)
+        if len(prompt) == 0:
+            raise ValueError("Prompts must contain at least one token")
+        if request.max_new_tokens <= 0:
+            return ""
+
+        device = self._model.device
+        idx = torch.tensor([prompt], device=device)
+        logits, states = self._forward(idx, prefill=True)
+        # All the beams start from the prompt, only the first one is expanded at
+        # the first step
+        beams = torch.zeros(self._num_beams, dtype=torch.long, device=device)
+        states = select_states(states, beams)
+        logits = logits.index_select(0, beams)
+        beam_scores = torch.full((self._num_beams,), -torch.inf, device=device)
+        beam_scores[0] = 0
+        texts = [""] * self._num_beams
+        # Finished hypotheses, as (normalized score, text)
+        finished: list[tuple[float, str]] = []
+
+        for length in range(1, request.max_new_tokens + 1):
+            scores = beam_scores.unsqueeze(1) + torch.log_softmax(logits.float(), -1)
+            top_scores, top_idx = scores.flatten().topk(
+                min(2 * self._num_beams, scores.numel())
+            )
+
+            next_beams, next_idx, next_scores, next_texts = [], [], [], []
+            for score, idx in zip(top_scores.tolist(), top_idx.tolist()):
+                if score == -torch.inf or len(next_beams) == self._num_beams:
+                    break
+                beam, token = divmod(idx, scores.shape[1])
+                piece = self._tokenizer.decode([token])
+                text, stopped = truncate_at_stop(
+                    texts[beam] + piece, len(piece), request.stop
+                )
+                if stopped or length == request.max_new_tokens:
+                    finished.append((self._normalize(score, length), text))
+                else:
+                    next_beams.append(beam)
+                    next_idx.append(token)
+                    next_scores.append(score)
+                    next_texts.append(text)
+
+            finished = sorted(finished, reverse=True)[: self._num_beams]
+            if not next_beams or self._is_done(finished, next_scores[0], length):
+                break
+
+            # The states follow the surviving beams
+            beams = torch.tensor(next_beams, device=device)
+            states = select_states(states, beams)
+            beam_scores = torch.tensor(next_scores, device=device)
+            texts = next_texts
+            logits, states = self._step(torch.tensor(next_idx, device=device), states)
+
+        return finished[0][1]
+
+    def _normalize(self, score: float, length: int) -> float:
+        return score / length**self._length_penalty
+
+    def _is_done(
+        self, finished: list[tuple[float, str]], best_score: float, length: int
+    ) -> bool:
+        if len(finished) < self._num_beams:
+            return False
+        if self._early_stopping:
+            return True
+
+        # The best running beam, if it ended now, could not enter the finished ones
+        return self._normalize(best_score, length) <= finished[-1][0]
@@ -0,0 +1,130 @@
+import hashlib
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import torch
+
+from minimamba.models.mini_mamba import MambaBlockState
+
+
+@dataclass
+class _Entry:
+    logits: torch.tensor
+    states: list[MambaBlockState]
+    num_bytes: int
+
+
+class PrefixStateCache:
+    """States of the model after prompt prefixes, to skip their prefill
+
+    A recurrent model summarizes any prefix with states of fixed size, so a
+    prompt can resume from the longest prefix already seen. Prefixes are cut
+    every block_size tokens and each block is keyed by a hash of its tokens
+    chained with the key of the previous block, so the key identifies the whole
+    prefix. The least recently used entries are evicted to stay within max_bytes.
+
+    Args:
+        max_bytes (int): memory budget of the cached states and logits
+        block_size (int): number of tokens between two cached prefixes
+    """
+
+    def __init__(self, max_bytes: int, block_size: int = 64) -> None:
+        self._max_bytes = max_bytes
+        self._block_size = block_size
+        self._entries: OrderedDict[bytes, _Entry] = OrderedDict()
+        self.num_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def prefill(
+        self, forward: Callable, prompt: list[int], device: torch.device
+    ) -> tuple[torch.tensor, list[MambaBlockState]]:
+        """Process a prompt starting from its longest cached prefix
+
+        The prefixes at the block boundaries met along the way are cached.
+
+        Args:
+            forward (Callable): forward of the model, called with prefill=True
+            prompt (list[int]): tokens of the prompt, at least one
+            device (torch.device): device of the model
+
+        Returns:
+            tuple[torch.tensor, list[MambaBlockState]]: next token logits (1, V) and
+            states of the layers after the prompt
+        """
+        keys = self._keys(prompt)
+        logits, states, start = None, None, 0
+        for i in reversed(range(len(keys))):
+            entry = self._entries.get(keys[i])
+            if entry is not None:
+                self._entries.move_to_end(keys[i])
+                logits, states = entry.logits, entry.states
+                start = (i + 1) * self._block_size
+                break
+
+        if start > 0:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+        # The missing blocks are processed one at a time to cache their states
+        for i in range(start // self._block_size, len(keys)):
+            end = (i + 1) * self._block_size
+            logits, states = self._forward(forward, prompt[start:end], device, states)
+            self._insert(keys[i], logits, states)
+            start = end
+
+        if start < len(prompt):
+            logits, states = self._forward(forward, prompt[start:], device, states)
+
+        return logits, states
+
+    def _forward(
+        self,
+        forward: Callable,
+        tokens: list[int],
+        device: torch.device,
+        states: Optional[list[MambaBlockState]],
+    ) -> tuple[torch.tensor, list[MambaBlockState]]:
+        idx = torch.tensor([tokens], device=device)
+        return forward(idx, prefill=True, states=states)
+
+    def _keys(self, prompt: list[int]) -> list[bytes]:
+        # One key per complete block, each one depends on all the previous tokens
+        keys, key = [], b""
+        for start in range(0, len(prompt) - self._block_size + 1, self._block_size):
+            block = array("q", prompt[start : start + self._block_size]).tobytes()
+            key = hashlib.sha256(key + block).digest()
+            keys.append(key)
+
+        return keys
+
+    def _insert(
+        self, key: bytes, logits: torch.tensor, states: list[MambaBlockState]
+    ) -> None:
+        # Compact copies, the states may be views of larger tensors
+        states = [
+            MambaBlockState(conv=state.conv.clone(), ssm=state.ssm.clone())
+            for state in states
+        ]
+        logits = logits.clone()
+        num_bytes = logits.nbytes + sum(
+            state.conv.nbytes + state.ssm.nbytes for state in states
+        )
+        if num_bytes > self._max_bytes:
+            return
+
+        if key in self._entries:
+            self.num_bytes -= self._entries.pop(key).num_bytes
+        self._entries[key] = _Entry(logits, states, num_bytes)
+        self.num_bytes += num_bytes
+
+        # Evict the least recently used entries
+        while self.num_bytes > self._max_bytes:
+            _, entry = self._entries.popitem(last=False)
+            self.num_bytes -= entry.num_bytes
@@ -0,0 +1,107 @@
+from typing import Optional
+
+import torch
+
+from minimamba.configs.models import SamplingConfig
+
+
+def sample(
+    logits: torch.tensor,
+    config: Optional[SamplingConfig] = None,
+    presence: Optional[torch.tensor] = None,
+    generator: Optional[torch.Generator] = None,
+) -> torch.tensor:
+    """Pick the next token of each sequence
+
+    Everything runs on the device of the logits, the result is not read by the
+    host so the decode loop never waits for the device.
+
+    Args:
+        logits (torch.tensor): next token logits, shape (B, V)
+        config (Optional[SamplingConfig]): temperature, top-k, top-p and
+            repetition penalty, greedy decoding if None
+        presence (Optional[torch.tensor]): tokens already in each sequence, bool of
+            shape (B, V), needed by the repetition penalty
+        generator (Optional[torch.Generator]): source of randomness
+
+    Returns:
+        torch.tensor: next tokens, shape (B,)
+    """
+    if config is None:
+        return logits.argmax(-1)
+
+    logits = logits.float()
+    if config.repetition_penalty != 1.0 and presence is not None:
+        logits = apply_repetition_penalty(logits, presence, config.repetition_penalty)
+    if config.temperature == 0:
+        return logits.argmax(-1)
+
+    logits = logits / config.temperature
+    if config.top_k is not None:
+        logits = top_k_filter(logits, config.top_k)
+    if config.top_p is not None:
+        logits = top_p_filter(logits, config.top_p)
+
+    probs = torch.softmax(logits, -1)
+    return torch.multinomial(probs, 1, generator=generator).squeeze(-1)
+
+
+def apply_repetition_penalty(
+    logits: torch.tensor, presence: torch.tensor, penalty: float
+) -> torch.tensor:
+    """Make the tokens already in the sequences less likely (CTRL penalty)
+
+    Args:
+        logits (torch.tensor): next token logits, shape (B, V)
+        presence (torch.tensor): tokens already in each sequence, bool (B, V)
+        penalty (float): > 1 discourages repetitions
+
+    Returns:
+        torch.tensor: penalized logits
+    """
+    penalized = torch.where(logits > 0, logits / penalty, logits * penalty)
+    return torch.where(presence, penalized, logits)
+
+
+def top_k_filter(logits: torch.tensor, k: int) -> torch.tensor:
+    """Keep the k largest logits of each sequence, the others are set to -inf"""
+    kth = torch.topk(logits, min(k, logits.shape[-1])).values[..., -1:]
+    return logits.masked_fill(logits < kth, -torch.inf)
+
+
+def top_p_filter(logits: torch.tensor, p: float) -> torch.tensor:
+    """Keep the smallest set of most likely tokens whose probability reaches p"""
+    sorted_logits, sorted_idx = logits.sort(-1, descending=True)
+    probs = torch.softmax(sorted_logits, -1)
+    # The most likely token is always kept
+    remove = probs.cumsum(-1) - probs > p
+    sorted_logits = sorted_logits.masked_fill(remove, -torch.inf)
+    return logits.scatter(-1, sorted_idx, sorted_logits)
+
+
+def token_presence(
+    sequences: list[list[int]], vocab_size: int, device: torch.device
+) -> torch.tensor:
+    """Mark the tokens contained in each sequence
+
+    Args:
+        sequences (list[list[int]]): tokens of each sequence
+        vocab_size (int): number of tokens in the vocabulary
+        device (torch.device): where the mask is created
+
+    Returns:
+        torch.tensor: bool mask, shape (B, V)
+    """
+    presence = torch.zeros(len(sequences), vocab_size, dtype=torch.bool, device=device)
+    rows = torch.tensor(
+        [row for row, sequence in enumerate(sequences) for _ in sequence],
+        dtype=torch.long,
+        device=device,
+    )
+    idx = torch.tensor(
+        [token for sequence in sequences for token in sequence],
+        dtype=torch.long,
+        device=device,
+    )
+    presence[rows, idx] = True
+    return presence
@@ -0,0 +1,218 @@
+import asyncio
+import threading
+from dataclasses import dataclass, field
+from typing import Optional
+
+import torch
+
+from minimamba.configs.models import SamplingConfig
+from minimamba.generation.batch_generator import (
+    GenerationRequest,
+    prefill,
+    truncate_at_stop,
+)
+from minimamba.generation.prefix_cache import PrefixStateCache
+from minimamba.generation.sampling import sample, token_presence
+from minimamba.generation.tokenizer import CharTokenizer
+from minimamba.models.mini_mamba import (
+    MambaBlockState,
+    MiniMamba,
+    cat_states,
+    select_states,
+)
+
+
+@dataclass
+class GenerationResult:
+    """Completion of a request
+
+    Args:
+        completion (str): generated text, without the stop string
+        num_tokens (int): number of generated tokens
+    """
+
+    completion: str
+    num_tokens: int
+
+
+@dataclass
+class _Sequence:
+    request: GenerationRequest
+    prompt: list[int]
+    future: asyncio.Future
+    text: str = ""
+    num_tokens: int = 0
+    # Set by the event loop once the future is done, e.g. cancelled, the worker
+    # thread reads this flag instead of the future, which is not thread safe
+    done: threading.Event = field(default_factory=threading.Event)
+
+
+class ContinuousBatchScheduler:
+    """Decode all the pending requests together, with continuous batching
+
+    At every step the new requests are prefilled and join the decode batch, and
+    the finished ones leave it, so a request never waits for the others to end.
+    The rows of the batch are the recurrent states of the sequences, which are
+    joined with cat_states and dropped with select_states. Cancelled requests,
+    e.g. of disconnected clients, leave the batch at the next step. The model runs
+    in a worker thread, the event loop keeps accepting requests in the meantime.
+
+    Args:
+        model (MiniMamba): language model in eval mode
+        tokenizer (CharTokenizer): tokenizer of the model
+        max_batch_size (int): maximum number of sequences decoded together
+        sampling (Optional[SamplingConfig]): how tokens are sampled, greedy if None
+        prefix_cache (Optional[PrefixStateCache]): if given, prompts resume from
+            the states of their longest cached prefix
+    """
+
+    def __init__(
+        self,
+        model: MiniMamba,
+        tokenizer: CharTokenizer,
+        max_batch_size: int = 32,
+        sampling: Optional[SamplingConfig] = None,
+        prefix_cache: Optional[PrefixStateCache] = None,
+    ) -> None:
+        self._model = model
+        self._tokenizer = tokenizer
+        self._max_batch_size = max_batch_size
+        self._sampling = sampling
+        self._prefix_cache = prefix_cache
+        self._generator: Optional[torch.Generator] = None
+        if sampling is not None and sampling.seed is not None:
+            self._generator = torch.Generator(model.device).manual_seed(sampling.seed)
+
+        self._waiting: list[_Sequence] = []
+        self._new_request = asyncio.Event()
+        # Decode batch: one row of logits, states and presence per running sequence
+        self._running: list[_Sequence] = []
+        self._logits: Optional[torch.tensor] = None
+        self._states: Optional[list[MambaBlockState]] = None
+        self._presence: Optional[torch.tensor] = None
+
+    async def submit(self, request: GenerationRequest) -> GenerationResult:
+        """Wait for the completion of a request
+
+        Args:
+            request (GenerationRequest): prompt and stopping criteria
+
+        Raises:
+            ValueError: if the prompt is empty or not in the vocabulary
+
+        Returns:
+            GenerationResult: completion of the request
+        """
+        try:
+            prompt = self._tokenizer.encode(request.prompt)
+        except KeyError as e:
+            raise ValueError(f"Character {e} is not in the vocabulary") from e
+        if len(prompt) == 0:
+            raise ValueError("Prompts must contain at least one token")
+        if request.max_new_tokens <= 0:
+            return GenerationResult("", 0)
+
+        sequence = _Sequence(request, prompt, asyncio.get_running_loop().create_future())
+        sequence.future.add_done_callback(lambda _: sequence.done.set())
+        self._waiting.append(sequence)
+        self._new_request.set()
+
+        return await sequence.future
+
+    async def run(self) -> None:
+        """Decode loop, to be run as a task for the whole life of the scheduler"""
+        while True:
+            if not self._running and not self._waiting:
+                self._new_request.clear()
+                await self._new_request.wait()
+
+            # Requests whose client went away are not decoded
+            self._waiting = [seq for seq in self._waiting if not seq.done.is_set()]
+            num_joining = self._max_batch_size - len(self._running)
+            joining = self._waiting[:num_joining]
+            self._waiting = self._waiting[num_joining:]
+            try:
+                finished = await asyncio.to_thread(self._step, joining)
+            except Exception as e:
+                # The batch is lost, the error goes to all its requests
+                for sequence in self._running + joining:
+                    if not sequence.future.done():
+                        sequence.future.set_exception(e)
+                self._running, self._logits, self._states = [], None, None
+                self._presence = None
+                continue
+
+            for sequence in finished:
+                if not sequence.future.done():
+                    sequence.future.set_result(
+                        GenerationResult(sequence.text, sequence.num_tokens)
+                    )
+
+    @torch.no_grad()
+    def _step(self, joining: list[_Sequence]) -> list[_Sequence]:
+        # Sequences whose client went away leave the batch before the step
+        alive = [row for row, seq in enumerate(self._running) if not seq.done.is_set()]
+        if len(alive) < len(self._running):
+            keep = self._keep(alive)
+            self._logits = self._logits.index_select(0, keep)
+        if joining:
+            self._join(joining)
+        if not self._running:
+            self._logits, self._states, self._presence = None, None, None
+            return []
+
+        next_idx = sample(self._logits, self._sampling, self._presence, self._generator)
+        if self._presence is not None:
+            self._presence.scatter_(1, next_idx.unsqueeze(1), True)
+
+        finished, running = [], []
+        for row, (sequence, token) in enumerate(zip(self._running, next_idx.tolist())):
+            sequence.num_tokens += 1
+            piece = self._tokenizer.decode([token])
+            sequence.text, stopped = truncate_at_stop(
+                sequence.text + piece, len(piece), sequence.request.stop
+            )
+            if stopped or sequence.num_tokens >= sequence.request.max_new_tokens:
+                finished.append(sequence)
+            else:
+                running.append(row)
+
+        # Finished sequences leave the batch
+        if len(running) < len(self._running):
+            next_idx = next_idx.index_select(0, self._keep(running))
+
+        if self._running:
+            self._logits, self._states = self._model.step(next_idx, self._states)
+        else:
+            self._logits, self._states, self._presence = None, None, None
+
+        return finished
+
+    def _keep(self, rows: list[int]) -> torch.tensor:
+        # Keep only the given rows of the states and presence, logits are left to
+        # the caller
+        keep = torch.tensor(rows, dtype=torch.long, device=self._logits.device)
+        self._states = select_states(self._states, keep)
+        if self._presence is not None:
+            self._presence = self._presence.index_select(0, keep)
+        self._running = [self._running[row] for row in rows]
+
+        return keep
+
+    def _join(self, joining: list[_Sequence]) -> None:
+        prompts = [sequence.prompt for sequence in joining]
+        logits, states = prefill(
+            self._model, prompts, self._model.device, self._prefix_cache
+        )
+        presence = None
+        if self._sampling is not None and self._sampling.repetition_penalty != 1.0:
+            presence = token_presence(prompts, logits.shape[-1], self._model.device)
+
+        if self._running:
+            logits = torch.cat([self._logits, logits])
+            states = cat_states([self._states, states])
+            if presence is not None:
+                presence = torch.cat([self._presence, presence])
+
+        self._running = self._running + joining
+        self._logits, self._states, self._presence = logits, states, presence
@@ -0,0 +1,204 @@
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+import torch
+
+from minimamba.configs.models import SamplingConfig
+from minimamba.generation.sampling import sample
+from minimamba.generation.tokenizer import CharTokenizer
+from minimamba.models.mini_mamba import MambaBlockState, MiniMamba
+
+
+class SessionStateStore:
+    """Recurrent states of long lived sessions, hot in RAM and cold on disk
+
+    The states of a session (batch size 1) have the same shapes for every
+    session, so each cold session takes a fixed size slot of a memory-mapped
+    file: the conv and ssm states of every layer, one after the other. The most
+    recently used sessions stay in RAM; when there are more than max_hot_sessions
+    the least recently used one is written to a free slot.
+
+    get returns views of the slot for a cold session, nothing is copied when it
+    is resumed on the CPU in the same dtype. The slot stays assigned to the
+    session until its states are replaced with put, or it is removed.
+
+    Args:
+        model (MiniMamba): model whose states are stored
+        path (str): file of the arena, created or overwritten
+        num_slots (int): maximum number of cold sessions
+        max_hot_sessions (int): maximum number of sessions kept in RAM
+        half (bool): store the states in fp16, hot and cold
+    """
+
+    def __init__(
+        self,
+        model: MiniMamba,
+        path: str,
+        num_slots: int,
+        max_hot_sessions: int = 64,
+        half: bool = False,
+    ) -> None:
+        states = model.init_states(1)
+        self._device = states[0].ssm.device
+        self._state_dtype = states[0].ssm.dtype
+        self._dtype = torch.float16 if half else torch.float32
+        self._max_hot_sessions = max_hot_sessions
+
+        # Offset and shape of every tensor inside a slot
+        self._layout: list[tuple[int, torch.Size]] = []
+        slot_size = 0
+        for state in states:
+            for tensor in (state.conv, state.ssm):
+                self._layout.append((slot_size, tensor.shape))
+                slot_size += tensor.numel()
+
+        self._arena = np.memmap(
+            path,
+            dtype=np.float16 if half else np.float32,
+            mode="w+",
+            shape=(num_slots, slot_size),
+        )
+        self._slots = torch.from_numpy(self._arena)
+        self._free_slots = list(range(num_slots - 1, -1, -1))
+
+        self._hot: OrderedDict[str, list[MambaBlockState]] = OrderedDict()
+        self._cold: dict[str, int] = {}
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._hot or session_id in self._cold
+
+    def __len__(self) -> int:
+        return len(self._hot) + len(self._cold)
+
+    @property
+    def num_cold(self) -> int:
+        return len(self._cold)
+
+    def put(self, session_id: str, states: list[MambaBlockState]) -> None:
+        """Store the states of a session, replacing the previous ones
+
+        Args:
+            session_id (str): identifier of the session
+            states (list[MambaBlockState]): states of the layers, batch size 1
+
+        Raises:
+            RuntimeError: if a session must be spilled and the arena is full, the
+                session is then not stored
+        """
+        states = [
+            MambaBlockState(
+                conv=state.conv.to(self._dtype, copy=True),
+                ssm=state.ssm.to(self._dtype, copy=True),
+            )
+            for state in states
+        ]
+        self.remove(session_id)
+
+        # Room is made before the session is added, a failing spill leaves the
+        # store consistent
+        while self._hot and len(self._hot) >= self._max_hot_sessions:
+            self._spill()
+        self._hot[session_id] = states
+
+    def get(self, session_id: str) -> Optional[list[MambaBlockState]]:
+        """Get the states of a session
+
+        Args:
+            session_id (str): identifier of the session
+
+        Returns:
+            Optional[list[MambaBlockState]]: states of the layers in the dtype and on
+            the device of the model, None for an unknown session
+        """
+        if session_id in self._hot:
+            self._hot.move_to_end(session_id)
+            states = self._hot[session_id]
+        elif session_id in self._cold:
+            states = self._load(self._cold[session_id])
+        else:
+            return None
+
+        return [
+            MambaBlockState(
+                conv=state.conv.to(self._device, self._state_dtype),
+                ssm=state.ssm.to(self._device, self._state_dtype),
+            )
+            for state in states
+        ]
+
+    def remove(self, session_id: str) -> None:
+        """Forget a session, its slot becomes free
+
+        Args:
+            session_id (str): identifier of the session
+        """
+        self._hot.pop(session_id, None)
+        if session_id in self._cold:
+            self._free_slots.append(self._cold.pop(session_id))
+
+    def _spill(self) -> None:
+        if not self._free_slots:
+            raise RuntimeError("No free slots left in the session arena")
+
+        # The session moves only once it is written
+        session_id, states = next(iter(self._hot.items()))
+        slot = self._free_slots[-1]
+        tensors = [tensor for state in states for tensor in (state.conv, state.ssm)]
+        self._slots[slot] = torch.cat([tensor.flatten().cpu() for tensor in tensors])
+        del self._hot[session_id]
+        self._cold[session_id] = self._free_slots.pop()
+
+    def _load(self, slot: int) -> list[MambaBlockState]:
+        tensors = [
+            self._slots[slot, offset : offset + shape.numel()].view(shape)
+            for offset, shape in self._layout
+        ]
+        return [
+            MambaBlockState(conv=conv, ssm=ssm)
+            for conv, ssm in zip(tensors[::2], tensors[1::2])
+        ]
+
+
+@torch.no_grad()
+def chat_turn(
+    model: MiniMamba,
+    tokenizer: CharTokenizer,
+    store: SessionStateStore,
+    session_id: str,
+    text: str,
+    max_new_tokens: int,
+    sampling: Optional[SamplingConfig] = None,
+) -> str:
+    """Continue a session with a new message and generate the reply
+
+    Only the new text is processed, starting from the stored states. The states
+    after the reply are stored back.
+
+    Args:
+        model (MiniMamba): language model in eval mode
+        tokenizer (CharTokenizer): tokenizer of the model
+        store (SessionStateStore): states of the sessions
+        session_id (str): identifier of the session, new sessions start empty
+        text (str): new message, at least one token
+        max_new_tokens (int): number of generated tokens
+        sampling (Optional[SamplingConfig]): how tokens are sampled, greedy if None
+
+    Returns:
+        str: the reply
+    """
+    idx = torch.tensor([tokenizer.encode(text)], device=model.device)
+    logits, states = model(idx, prefill=True, states=store.get(session_id))
+
+    output_idx = []
+    for _ in range(max_new_tokens):
+        next_idx = sample(logits, sampling)
+        output_idx.append(next_idx)
+        # The reply is part of the session, its last token is processed too
+        logits, states = model.step(next_idx, states)
+
+    store.put(session_id, states)
+    if not output_idx:
+        return ""
+
+    return tokenizer.decode(torch.cat(output_idx).tolist())
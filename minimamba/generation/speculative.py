@@ -0,0 +1,156 @@
+from typing import Optional
+
+import torch
+
+from minimamba.configs.models import CompileConfig
+from minimamba.generation.batch_generator import (
+    BatchGenerator,
+    GenerationRequest,
+    prefill,
+    truncate_at_stop,
+)
+from minimamba.generation.tokenizer import CharTokenizer
+from minimamba.models.mini_mamba import (
+    MambaBlockState,
+    MiniMamba,
+    select_states,
+    stack_states,
+    states_at,
+)
+from minimamba.utils.compile import compile_if_configured
+
+
+class SpeculativeGenerator(BatchGenerator):
+    """Greedy generation where a small draft model proposes the next tokens
+
+    At each round the draft model proposes num_draft_tokens tokens one at a time,
+    then the main model processes all of them with a single extend call. The
+    proposals are accepted up to the first one that differs from the greedy
+    choice of the main model, which also gives the next token for free. The
+    states of both models after every token are kept, so going back to the last
+    accepted token is just a selection. The completions are the same as greedy
+    decoding with the main model alone.
+
+    Args:
+        model (MiniMamba): main language model in eval mode
+        draft_model (MiniMamba): smaller model with the same vocabulary
+        tokenizer (CharTokenizer): tokenizer of the models
+        num_draft_tokens (int): number of tokens proposed at each round
+        batch_size (int): maximum number of sequences decoded together
+        compile (Optional[CompileConfig]): if given, the models are compiled
+
+    Raises:
+        ValueError: if num_draft_tokens is smaller than 1
+    """
+
+    def __init__(
+        self,
+        model: MiniMamba,
+        draft_model: MiniMamba,
+        tokenizer: CharTokenizer,
+        num_draft_tokens: int = 4,
+        batch_size: int = 32,
+        compile: Optional[CompileConfig] = None,
+    ) -> None:
+        if num_draft_tokens < 1:
+            raise ValueError("At least one draft token must be proposed at each round")
+
+        super().__init__(model, tokenizer, batch_size, compile)
+        self._extend = compile_if_configured(model.extend, compile)
+        self._draft_forward = compile_if_configured(draft_model, compile)
+        self._draft_step = compile_if_configured(draft_model.step, compile)
+        self._num_draft_tokens = num_draft_tokens
+        self.num_proposed = 0
+        self.num_accepted = 0
+
+    @property
+    def acceptance_rate(self) -> float:
+        """Fraction of the proposed tokens accepted by the main model"""
+        return self.num_accepted / max(self.num_proposed, 1)
+
+    def _generate_batch(
+        self, requests: list[GenerationRequest], prompts: list[list[int]]
+    ) -> list[str]:
+        device = self._model.device
+        logits, states = prefill(self._forward, prompts, device)
+        _, draft_states = prefill(self._draft_forward, prompts, device)
+        # Last token of each sequence, not processed yet by the models
+        last_idx = logits.argmax(-1)
+        tokens = last_idx.unsqueeze(1).tolist()
+
+        num_tokens = [0] * len(requests)
+        texts = [""] * len(requests)
+        # Requests still being decoded, one per row of the batch
+        active = list(range(len(requests)))
+
+        while True:
+            running = []
+            for row, (i, row_tokens) in enumerate(zip(active, tokens)):
+                row_tokens = row_tokens[: requests[i].max_new_tokens - num_tokens[i]]
+                num_tokens[i] += len(row_tokens)
+                piece = self._tokenizer.decode(row_tokens)
+                texts[i], stopped = truncate_at_stop(
+                    texts[i] + piece, len(piece), requests[i].stop
+                )
+                if not stopped and num_tokens[i] < requests[i].max_new_tokens:
+                    running.append(row)
+
+            if not running:
+                break
+
+            # Finished sequences leave the batch, the next rounds only run the others
+            if len(running) < len(active):
+                keep = torch.tensor(running, device=last_idx.device)
+                last_idx = last_idx.index_select(0, keep)
+                states = select_states(states, keep)
+                draft_states = select_states(draft_states, keep)
+                active = [active[row] for row in running]
+
+            tokens, last_idx, states, draft_states = self._speculate(
+                last_idx, states, draft_states
+            )
+
+        return texts
+
+    def _speculate(
+        self,
+        last_idx: torch.tensor,
+        states: list[MambaBlockState],
+        draft_states: list[MambaBlockState],
+    ) -> tuple[
+        list[list[int]], torch.tensor, list[MambaBlockState], list[MambaBlockState]
+    ]:
+        k = self._num_draft_tokens
+        # The draft model also processes its last proposal, so that its state is
+        # ready when all of them are accepted
+        draft_idx, draft_steps = [], []
+        idx = last_idx
+        for i in range(k + 1):
+            draft_logits, draft_states = self._draft_step(idx, draft_states)
+            draft_steps.append(draft_states)
+            if i < k:
+                idx = draft_logits.argmax(-1)
+                draft_idx.append(idx)
+        draft_idx = torch.stack(draft_idx, 1)
+
+        # The main model checks all the proposals at once, the logits at position
+        # i give the token after the i-th proposal
+        logits, steps = self._extend(
+            torch.cat([last_idx.unsqueeze(1), draft_idx], 1), states
+        )
+        main_idx = logits.argmax(-1)
+        num_accepted = (draft_idx == main_idx[:, :k]).long().cumprod(1).sum(1)
+
+        # Back to the states after the last accepted token
+        states = states_at(steps, num_accepted)
+        draft_states = states_at(stack_states(draft_steps), num_accepted)
+        last_idx = main_idx.gather(1, num_accepted.unsqueeze(1)).squeeze(1)
+
+        # A single copy to the host per round: the accepted proposals are equal to
+        # the tokens of the main model, followed by its next token
+        rows = torch.cat([num_accepted.unsqueeze(1), main_idx], 1).tolist()
+        self.num_proposed += k * len(rows)
+        self.num_accepted += sum(row[0] for row in rows)
+        tokens = [row[1 : row[0] + 2] for row in rows]
+
+        return tokens, last_idx, states, draft_states
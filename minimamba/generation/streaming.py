@@ -0,0 +1,157 @@
+import asyncio
+from typing import AsyncIterator, Iterator, Optional
+
+import torch
+
+from minimamba.configs.models import SamplingConfig
+from minimamba.generation.batch_generator import GenerationRequest, truncate_at_stop
+from minimamba.generation.sampling import sample, token_presence
+from minimamba.generation.tokenizer import CharTokenizer
+from minimamba.models.mini_mamba import MambaBlockState, MiniMamba
+
+
+class TokenStream:
+    """Completion of a single prompt, produced a piece at a time
+
+    The recurrent states of the model are kept between the calls of next_piece,
+    so each call only runs the new tokens. The text that could be the beginning
+    of a stop string is held back until it is clear whether the generation ends.
+
+    Args:
+        model (MiniMamba): language model in eval mode
+        tokenizer (CharTokenizer): tokenizer of the model
+        request (GenerationRequest): prompt and stopping criteria
+        sampling (Optional[SamplingConfig]): how tokens are sampled, greedy if None
+    """
+
+    def __init__(
+        self,
+        model: MiniMamba,
+        tokenizer: CharTokenizer,
+        request: GenerationRequest,
+        sampling: Optional[SamplingConfig] = None,
+    ) -> None:
+        self._model = model
+        self._tokenizer = tokenizer
+        self._request = request
+        self._sampling = sampling
+        self._generator: Optional[torch.Generator] = None
+        if sampling is not None and sampling.seed is not None:
+            self._generator = torch.Generator(model.device).manual_seed(sampling.seed)
+
+        self._prompt = tokenizer.encode(request.prompt)
+        if len(self._prompt) == 0:
+            raise ValueError("Prompts must contain at least one token")
+        self._logits: Optional[torch.tensor] = None
+        self._next_idx: Optional[torch.tensor] = None
+        self._states: Optional[list[MambaBlockState]] = None
+        self._presence: Optional[torch.tensor] = None
+        self._num_tokens = 0
+        self._pending = ""
+        self._done = request.max_new_tokens <= 0
+
+    @torch.no_grad()
+    def next_piece(self) -> Optional[str]:
+        """Generate tokens until a new piece of text is ready
+
+        Returns:
+            Optional[str]: new text, None when the generation is over
+        """
+        while not self._done:
+            if self._logits is None:
+                self._prefill()
+            else:
+                self._logits, self._states = self._model.step(
+                    self._next_idx, self._states
+                )
+
+            self._next_idx = sample(
+                self._logits, self._sampling, self._presence, self._generator
+            )
+            if self._presence is not None:
+                self._presence.scatter_(1, self._next_idx.unsqueeze(1), True)
+            self._num_tokens += 1
+
+            text = self._pending + self._tokenizer.decode([self._next_idx.item()])
+            text, stopped = truncate_at_stop(text, len(text), self._request.stop)
+            self._done = stopped or self._num_tokens >= self._request.max_new_tokens
+            # Text that may be the beginning of a stop string waits for the next tokens
+            held = 0 if self._done else _stop_prefix_length(text, self._request.stop)
+            self._pending = text[len(text) - held :]
+            if len(text) > held:
+                return text[: len(text) - held]
+
+        return None
+
+    def _prefill(self) -> None:
+        idx = torch.tensor([self._prompt], device=self._model.device)
+        self._logits, self._states = self._model(idx, prefill=True)
+        if self._sampling is not None and self._sampling.repetition_penalty != 1.0:
+            self._presence = token_presence(
+                [self._prompt], self._logits.shape[-1], self._model.device
+            )
+
+
+def stream_generate(
+    model: MiniMamba,
+    tokenizer: CharTokenizer,
+    request: GenerationRequest,
+    sampling: Optional[SamplingConfig] = None,
+) -> Iterator[str]:
+    """Yield the completion of a prompt as soon as each piece is generated
+
+    Args:
+        model (MiniMamba): language model in eval mode
+        tokenizer (CharTokenizer): tokenizer of the model
+        request (GenerationRequest): prompt and stopping criteria
+        sampling (Optional[SamplingConfig]): how tokens are sampled, greedy if None
+
+    Yields:
+        str: pieces of the completion
+    """
+    stream = TokenStream(model, tokenizer, request, sampling)
+    while True:
+        piece = stream.next_piece()
+        if piece is None:
+            return
+        yield piece
+
+
+async def astream_generate(
+    model: MiniMamba,
+    tokenizer: CharTokenizer,
+    request: GenerationRequest,
+    sampling: Optional[SamplingConfig] = None,
+) -> AsyncIterator[str]:
+    """Asynchronous version of stream_generate
+
+    Each step of the model runs in a worker thread, so the event loop can serve
+    other streams in the meantime.
+
+    Args:
+        model (MiniMamba): language model in eval mode
+        tokenizer (CharTokenizer): tokenizer of the model
+        request (GenerationRequest): prompt and stopping criteria
+        sampling (Optional[SamplingConfig]): how tokens are sampled, greedy if None
+
+    Yields:
+        str: pieces of the completion
+    """
+    stream = TokenStream(model, tokenizer, request, sampling)
+    while True:
+        piece = await asyncio.to_thread(stream.next_piece)
+        if piece is None:
+            return
+        yield piece
+
+
+def _stop_prefix_length(text: str, stop: list[str]) -> int:
+    # Longest end of the text that is the beginning of a stop string
+    length = 0
+    for stop_str in stop:
+        for n in range(min(len(stop_str) - 1, len(text)), length, -1):
+            if stop_str.startswith(text[len(text) - n :]):
+                length = n
+                break
+
+    return length
@@ -0,0 +1,46 @@
+import os
+
+import requests
+
+# Text of the tiny shakespeare dataset, the vocabulary of the char level models
+SHAKESPEARE_URL = "https://raw.githubusercontent.com/karpathy/char-rnn/master/data/tinyshakespeare/input.txt"
+
+
+class CharTokenizer:
+    """Map each character of a text to an integer
+
+    Args:
+        text (str): text whose (sorted) unique characters are the vocabulary
+    """
+
+    def __init__(self, text: str) -> None:
+        chars = sorted(set(text))
+        self._stoi = {ch: i for i, ch in enumerate(chars)}
+        self._itos = {i: ch for i, ch in enumerate(chars)}
+
+    @property
+    def vocab_size(self) -> int:
+        return len(self._stoi)
+
+    def encode(self, s: str) -> list[int]:
+        return [self._stoi[c] for c in s]
+
+    def decode(self, idx: list[int]) -> str:
+        return "".join([self._itos[i] for i in idx])
+
+
+def load_shakespeare_tokenizer(path: str = "/tmp/file.txt") -> CharTokenizer:
+    """Tokenizer of the models trained on data/shakespeare_char
+
+    Args:
+        path (str): where the dataset is cached, downloaded if it does not exist
+
+    Returns:
+        CharTokenizer: tokenizer with the characters of tiny shakespeare
+    """
+    if not os.path.exists(path):
+        with open(path, "w") as f:
+            f.write(requests.get(SHAKESPEARE_URL).text)
+
+    with open(path, "r") as f:
+        return CharTokenizer(f.read())
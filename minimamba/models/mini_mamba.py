@@ -1,10 +1,34 @@
+import math
+from dataclasses import dataclass
+from typing import Optional, Union
+
 import torch
 from torch import nn
 import torch.nn.functional as F
+from torch.utils.checkpoint import checkpoint
 
-from minimamba.configs.models import MiniMambaConfig, MiniMambaBlockConfig
+from minimamba.configs.models import (
+    MiniMambaConfig,
+    MiniMambaBlockConfig,
+    MiniMambaSSDBlockConfig,
+)
 from minimamba.models.nn_model import NNModel
-from minimamba.models.utils.rmsnorm import RMSNorm
+from minimamba.models.utils.causal_conv import CausalDepthwiseConv1d
+from minimamba.models.utils.chunked_cross_entropy import chunked_cross_entropy
+from minimamba.models.utils.gated_projection import gated_projection
+from minimamba.models.utils.rmsnorm import FusedRMSNorm, RMSNorm
+from minimamba.models.utils.selective_scan import (
+    SCAN_FUNCTIONS,
+    chunked_selective_scan,
+    fused_selective_scan,
+    discretize,
+    recompute_selective_scan,
+    segsum_selective_scan,
+    selective_scan,
+    sequential_scan,
+    ssd_scan,
+    ssd_states,
+)
 
 
 class MiniMamba(NNModel):
@@ -20,7 +44,16 @@ class MiniMamba(NNModel):
         self._input_embed = nn.Embedding(config.vocab_size, config.embedding_dim)
         self._proj = nn.Linear(config.embedding_dim, config.blocks[0].layer_input)
         # Define Blocks
-        self._layers = torch.nn.ModuleList([MambaBlock(conf) for conf in config.blocks])
+        self._layers = torch.nn.ModuleList(
+            [
+                SSDBlock(conf)
+                if isinstance(conf, MiniMambaSSDBlockConfig)
+                else MambaBlock(conf)
+                for conf in config.blocks
+            ]
+        )
+        # Blocks whose activations are recomputed during backward
+        self._checkpoint: list[bool] = [conf.checkpoint for conf in config.blocks]
         # Define output embeddings
         layer_output_dim: int = (
             config.blocks[-1].layer_out
@@ -29,42 +62,274 @@ class MiniMamba(NNModel):
         )
         self._head = torch.nn.Linear(layer_output_dim, config.vocab_size)
         self._lr = config.lr
+        # If set, the loss is computed without storing the logits of the whole batch
+        self._loss_chunk_size: Optional[int] = config.loss_chunk_size
+
+    def forward(
+        self,
+        x: torch.tensor,
+        prefill: bool = False,
+        states: Optional[list["MambaBlockState"]] = None,
+    ) -> Union[torch.tensor, tuple[torch.tensor, list["MambaBlockState"]]]:
+        """Process whole sequences
+
+        Args:
+            x (torch.tensor): tokens, shape (B, T)
+            prefill (bool): if True, only the logits of the next token (B, V) are
+                computed and they are returned with the states of the layers at the
+                end of the sequences, ready to continue with step()
+            states (Optional[list[MambaBlockState]]): in prefill mode, states of the
+                layers after the previous tokens, the sequences start from scratch
+                if None
+
+        Returns:
+            Union[torch.tensor, tuple[torch.tensor, list[MambaBlockState]]]: logits
+            (B, T, V), or next token logits and states in prefill mode
+        """
+        x, states = self._features(x, prefill, states)
+
+        if prefill:
+            return self._head(x[:, -1]), states
 
-    def forward(self, x: torch.tensor) -> torch.tensor:
-        # Get the embeddings and projection
-        x = self._input_embed(x)
+        # Head
+        x = self._head(x)
+
+        return x
+
+    def step(
+        self, idx: torch.tensor, states: Optional[list["MambaBlockState"]] = None
+    ) -> tuple[torch.tensor, list["MambaBlockState"]]:
+        """Process a single token per sequence, updating the recurrent states
+
+        Args:
+            idx (torch.tensor): last token of each sequence, shape (B,)
+            states (Optional[list[MambaBlockState]]): states of the layers after the
+                previous tokens, new empty states if None
+
+        Returns:
+            tuple[torch.tensor, list[MambaBlockState]]: logits of the next token
+            (B, V) and the updated states
+        """
+        if states is None:
+            states = self.init_states(idx.shape[0])
+
+        x = self._input_embed(idx)
         x = self._proj(x)
 
-        # Execute layers
-        for layer in self._layers:
-            x = layer(x)
+        new_states = []
+        for layer, state in zip(self._layers, states):
+            x, state = layer.step(x, state)
+            new_states.append(state)
 
-        # Head
         x = self._head(x)
 
-        return x
+        return x, new_states
 
-    def training_step(self, batch: tuple[torch.tensor, torch.tensor], batch_idx: int):
-        x, y = batch
-        logits = self(x)
-        loss = F.cross_entropy(
-            logits.view(-1, logits.size(-1)), y.view(-1), ignore_index=-1
+    def extend(
+        self, idx: torch.tensor, states: list["MambaBlockState"]
+    ) -> tuple[torch.tensor, list["MambaBlockState"]]:
+        """Process a few tokens per sequence after the given states
+
+        The projections see all the tokens at once, as in forward, and the state
+        after each token is kept, so that decoding can restart from any of them
+        (look at states_at).
+
+        Args:
+            idx (torch.tensor): next tokens of each sequence, shape (B, T)
+            states (list[MambaBlockState]): states of the layers after the previous
+                tokens
+
+        Returns:
+            tuple[torch.tensor, list[MambaBlockState]]: logits (B, T, V) and states
+            after each token, with the time at dim 1
+        """
+        x = self._input_embed(idx)
+        x = self._proj(x)
+
+        new_states = []
+        for layer, state in zip(self._layers, states):
+            x, state = layer.extend(x, state)
+            new_states.append(state)
+
+        x = self._head(x)
+
+        return x, new_states
+
+    def init_states(self, batch_size: int) -> list["MambaBlockState"]:
+        """Create the recurrent states of an empty sequence
+
+        Args:
+            batch_size (int): number of sequences
+
+        Returns:
+            list[MambaBlockState]: one state per layer
+        """
+        return [layer.init_state(batch_size) for layer in self._layers]
+
+    @torch.no_grad()
+    def optimize_for_inference(self) -> "MiniMamba":
+        """Fold the weights into an equivalent model that is cheaper to run
+
+        The projection of the embeddings is folded into the lookup table and each
+        block folds its own weights. The optimized model is meant for inference only.
+
+        Returns:
+            MiniMamba: the model itself, optimized in place
+        """
+        self._input_embed = nn.Embedding.from_pretrained(
+            self._proj(self._input_embed.weight)
         )
+        self._proj = nn.Identity()
+        for layer in self._layers:
+            layer.optimize_for_inference()
+
+        return self.eval()
+
+    def training_step(self, batch: tuple[torch.tensor, torch.tensor], batch_idx: int):
+        loss = self._loss(batch)
         self.log("train_loss", loss)
         return loss
 
     def validation_step(self, batch: tuple[torch.tensor, torch.tensor], batch_idx: int):
+        loss = self._loss(batch)
+        self.log("val_loss", loss)
+
+    def _features(
+        self,
+        x: torch.tensor,
+        prefill: bool = False,
+        states: Optional[list["MambaBlockState"]] = None,
+    ) -> tuple[torch.tensor, list["MambaBlockState"]]:
+        # Get the embeddings and projection
+        x = self._input_embed(x)
+        x = self._proj(x)
+        if states is None:
+            states = [None] * len(self._layers)
+
+        # Execute layers
+        new_states = []
+        for layer, use_checkpoint, state in zip(self._layers, self._checkpoint, states):
+            if prefill:
+                x, state = layer(x, return_state=True, state=state)
+                new_states.append(state)
+            elif use_checkpoint and torch.is_grad_enabled():
+                x = checkpoint(layer, x, use_reentrant=False)
+            else:
+                x = layer(x)
+
+        return x, new_states
+
+    def _loss(self, batch: tuple[torch.tensor, torch.tensor]) -> torch.tensor:
         x, y = batch
-        logits = self(x)
-        loss = F.cross_entropy(
-            logits.view(-1, logits.size(-1)), y.view(-1), ignore_index=-1
+        if self._loss_chunk_size is None:
+            logits = self(x)
+            return F.cross_entropy(
+                logits.view(-1, logits.size(-1)), y.view(-1), ignore_index=-1
+            )
+
+        x, _ = self._features(x)
+        return chunked_cross_entropy(
+            x.flatten(0, 1),
+            self._head.weight,
+            self._head.bias,
+            y.view(-1),
+            self._loss_chunk_size,
+            ignore_index=-1,
         )
-        self.log("val_loss", loss)
 
     def configure_optimizers(self):
         return torch.optim.Adam(self.parameters(), lr=self._lr)
 
 
+@dataclass
+class MambaBlockState:
+    """Recurrent state of a MambaBlock or SSDBlock during token by token inference
+
+    Args:
+        conv (torch.tensor): last conv_kernel - 1 inputs of the conv, shape (B, K-1, D)
+        ssm (torch.tensor): hidden state of the SSM, shape (B, D, N) for MambaBlock
+            and (B, H, P, N) for SSDBlock
+    """
+
+    conv: torch.tensor
+    ssm: torch.tensor
+
+
+def select_states(
+    states: list[MambaBlockState], index: torch.tensor
+) -> list[MambaBlockState]:
+    """Keep (or reorder) the sequences of a batch of recurrent states
+
+    Args:
+        states (list[MambaBlockState]): states of the layers
+        index (torch.tensor): sequences to be kept, shape (B',)
+
+    Returns:
+        list[MambaBlockState]: states of the selected sequences
+    """
+    return [
+        MambaBlockState(
+            conv=state.conv.index_select(0, index), ssm=state.ssm.index_select(0, index)
+        )
+        for state in states
+    ]
+
+
+def cat_states(batches: list[list[MambaBlockState]]) -> list[MambaBlockState]:
+    """Join the recurrent states of several batches into a single batch
+
+    Args:
+        batches (list[list[MambaBlockState]]): states of the layers of each batch
+
+    Returns:
+        list[MambaBlockState]: states of all the sequences, in the order of batches
+    """
+    return [
+        MambaBlockState(
+            conv=torch.cat([state.conv for state in layer_states]),
+            ssm=torch.cat([state.ssm for state in layer_states]),
+        )
+        for layer_states in zip(*batches)
+    ]
+
+
+def stack_states(steps: list[list[MambaBlockState]]) -> list[MambaBlockState]:
+    """Stack the states after consecutive time steps, the time goes at dim 1
+
+    Args:
+        steps (list[list[MambaBlockState]]): states of the layers after each step
+
+    Returns:
+        list[MambaBlockState]: states of the layers, shape (B, T, ...)
+    """
+    return [
+        MambaBlockState(
+            conv=torch.stack([state.conv for state in layer_states], 1),
+            ssm=torch.stack([state.ssm for state in layer_states], 1),
+        )
+        for layer_states in zip(*steps)
+    ]
+
+
+def states_at(
+    states: list[MambaBlockState], positions: torch.tensor
+) -> list[MambaBlockState]:
+    """Pick a time step of each sequence from states with the time at dim 1
+
+    Args:
+        states (list[MambaBlockState]): states of the layers, shape (B, T, ...)
+        positions (torch.tensor): time step of each sequence, shape (B,)
+
+    Returns:
+        list[MambaBlockState]: states of the layers at the given time steps
+    """
+    rows = torch.arange(positions.shape[0], device=positions.device)
+    return [
+        MambaBlockState(conv=state.conv[rows, positions], ssm=state.ssm[rows, positions])
+        for state in states
+    ]
+
+
 class MambaBlock(nn.Module):
     """Implementation of Mamba Block Model
 
@@ -76,69 +341,161 @@ class MambaBlock(nn.Module):
         super().__init__()
         working_dim = config.layer_input * config.expansion
         # Input norm
-        self._norm = RMSNorm(config.layer_input)
+        self._norm = (FusedRMSNorm if config.fused_ops else RMSNorm)(config.layer_input)
         # Projection for expansion block, x2 for gatedMLP
         self._in_projection = nn.Linear(config.layer_input, working_dim * 2)
 
-        # Projection output
-        self._out_projection = nn.Linear(
-            working_dim,
-            config.layer_out if config.layer_out is not None else config.layer_input,
+        # Projection output, with residual connection if the dimension is unchanged
+        layer_out = (
+            config.layer_out if config.layer_out is not None else config.layer_input
         )
+        self._out_projection = nn.Linear(working_dim, layer_out)
+        self._residual: bool = layer_out == config.layer_input
+        # In place norm and output epilogue when gradients are not needed
+        self._fused_ops: bool = config.fused_ops
 
         # Conv
-        self._conv = nn.Conv1d(
-            working_dim,
-            working_dim,
-            config.conv_kernel,
-            padding=config.conv_kernel - 1,
-            groups=working_dim,
-        )
+        self._conv = CausalDepthwiseConv1d(working_dim, config.conv_kernel)
 
         # SSM
         self._ssm = SelectiveStateSpaceModel(
-            working_dim, config.state_dim, config.fraction_d
+            working_dim,
+            config.state_dim,
+            config.fraction_d,
+            config.scan_mode,
+            config.chunk_size,
         )
 
-    def forward(self, x: torch.tensor) -> torch.tensor:
+    def forward(
+        self,
+        x: torch.tensor,
+        return_state: bool = False,
+        state: Optional[MambaBlockState] = None,
+    ) -> Union[torch.tensor, tuple[torch.tensor, MambaBlockState]]:
         residual = x
+        # Continue after the previous time steps if a state is given
+        conv_state, h0 = (None, None) if state is None else (state.conv, state.ssm)
         # X shape: B, T, D
         x = self._norm(x)
 
         # Expansion and separation between gated and main branch
         x, g = self._in_projection(x).chunk(2, -1)
 
+        if return_state:
+            new_conv_state = self._conv.tail(x, conv_state)
+
         #######################
         ##### Main Branch #####
         #######################
         # Conv
-        origin_T = x.shape[1]
-        x = x.transpose(1, 2)
-        x = self._conv(x)[..., :origin_T]
-        x = x.transpose(1, 2)
+        x = self._conv(x, conv_state)
 
         # Activation
         x = F.silu(x)
 
         # SSM
-        x = self._ssm(x)
+        x, ssm_state = self._ssm(x, return_state=True, h0=h0)
+
+        ####################################
+        ##### Gated Branch, Projection #####
+        ####################################
+        x = gated_projection(
+            x,
+            g,
+            self._out_projection,
+            residual if self._residual else None,
+            self._fused_ops,
+        )
 
-        #########################
-        ##### Gated Branch ######
-        #########################
-        g = F.silu(g)
+        if return_state:
+            return x, MambaBlockState(conv=new_conv_state, ssm=ssm_state)
 
-        #######################
-        ##### Projection ######
-        #######################
-        x = g * x
+        return x
 
-        x = self._out_projection(x)
+    def step(
+        self, x: torch.tensor, state: MambaBlockState
+    ) -> tuple[torch.tensor, MambaBlockState]:
+        """Process a single time step, look at forward for the details
 
-        if x.shape == residual.shape:
-            x = x + residual
+        Args:
+            x (torch.tensor): input of the current time step, shape (B, D)
+            state (MambaBlockState): state after the previous time steps
 
-        return x
+        Returns:
+            tuple[torch.tensor, MambaBlockState]: output (B, D) and updated state
+        """
+        residual = x
+        x = self._norm(x)
+        x, g = self._in_projection(x).chunk(2, -1)
+
+        x, conv_state = self._conv.step(x, state.conv)
+        x = F.silu(x)
+
+        x, ssm_state = self._ssm.step(x, state.ssm)
+
+        x = gated_projection(
+            x,
+            g,
+            self._out_projection,
+            residual if self._residual else None,
+            self._fused_ops,
+        )
+
+        return x, MambaBlockState(conv=conv_state, ssm=ssm_state)
+
+    def extend(
+        self, x: torch.tensor, state: MambaBlockState
+    ) -> tuple[torch.tensor, MambaBlockState]:
+        """Process a few time steps after state, keeping the state after each one
+
+        Args:
+            x (torch.tensor): inputs, shape (B, T, D)
+            state (MambaBlockState): state after the previous time steps
+
+        Returns:
+            tuple[torch.tensor, MambaBlockState]: output (B, T, D) and states with
+            the time at dim 1
+        """
+        residual = x
+        x = self._norm(x)
+        x, g = self._in_projection(x).chunk(2, -1)
+
+        x, conv_states = self._conv.extend(x, state.conv)
+        x = F.silu(x)
+
+        x, ssm_states = self._ssm.extend(x, state.ssm)
+
+        x = gated_projection(
+            x,
+            g,
+            self._out_projection,
+            residual if self._residual else None,
+            self._fused_ops,
+        )
+
+        return x, MambaBlockState(conv=conv_states, ssm=ssm_states)
+
+    def init_state(self, batch_size: int) -> MambaBlockState:
+        """Create the state of an empty sequence
+
+        Args:
+            batch_size (int): number of sequences
+
+        Returns:
+            MambaBlockState: zero state
+        """
+        weight = self._conv.weight
+        return MambaBlockState(
+            conv=weight.new_zeros(
+                batch_size, self._conv.kernel_size[0] - 1, weight.shape[0]
+            ),
+            ssm=weight.new_zeros(batch_size, *self._ssm._A_log.shape),
+        )
+
+    def optimize_for_inference(self) -> None:
+        """Fold the scale of the norm into the input projection, and optimize the SSM"""
+        self._norm.fold_scale(self._in_projection)
+        self._ssm.optimize_for_inference()
 
 
 class SelectiveStateSpaceModel(nn.Module):
@@ -148,9 +505,20 @@ class SelectiveStateSpaceModel(nn.Module):
         working_dim (int): feature dimension of the element
         state_dim (int): dimension of the state space
         fraction_d (int): fraction of working dim for delta
+        scan_mode (str): algorithm used for the recurrence, one of "sequential",
+            "parallel", "chunked", "recompute", "segsum" or "fused"
+        chunk_size (int): number of time steps per chunk in "chunked", "recompute"
+            and "segsum" modes, and in the backward of "fused" mode
     """
 
-    def __init__(self, working_dim: int, state_dim: int, fraction_d: int) -> None:
+    def __init__(
+        self,
+        working_dim: int,
+        state_dim: int,
+        fraction_d: int,
+        scan_mode: str = "sequential",
+        chunk_size: int = 64,
+    ) -> None:
         super().__init__()
 
         # S4D real initialization https://github.com/state-spaces/mamba/issues/167
@@ -164,10 +532,105 @@ class SelectiveStateSpaceModel(nn.Module):
         self._working_dim: int = working_dim
         self._state_dim: int = state_dim
         self._fraction_d: int = fraction_d
+        # A = -exp(A_log), precomputed by optimize_for_inference
+        self.register_buffer("_A", None, persistent=False)
+        self._scan_mode: str = scan_mode
+        self._chunk_size: int = chunk_size
+
+    def forward(
+        self,
+        x: torch.tensor,
+        return_state: bool = False,
+        h0: Optional[torch.tensor] = None,
+    ) -> Union[torch.tensor, tuple[torch.tensor, torch.tensor]]:
+        A, delta, B, C = self._get_parameters(x)
+
+        # Discretization, state update and output Y = C*H
+        y, h = self._selective_scan(x, delta, A, B, C, h0)
+
+        if return_state:
+            return y, h
+
+        return y
+
+    def step(self, x: torch.tensor, h: torch.tensor) -> tuple[torch.tensor, torch.tensor]:
+        """Process a single time step starting from the state h
+
+        Args:
+            x (torch.tensor): input of the current time step, shape (B, D)
+            h (torch.tensor): state after the previous time steps, shape (B, D, N)
+
+        Returns:
+            tuple[torch.tensor, torch.tensor]: output (B, D) and updated state
+        """
+        x = x.unsqueeze(1)
+        A, delta, B, C = self._get_parameters(x)
+        with torch.autocast(device_type=x.device.type, enabled=False):
+            y, h = fused_selective_scan(x.float(), delta, A, B.float(), C.float(), h)
+
+        return y[:, 0], h
+
+    def extend(
+        self, x: torch.tensor, h: torch.tensor
+    ) -> tuple[torch.tensor, torch.tensor]:
+        """Process a few time steps starting from the state h, keeping all the states
+
+        Args:
+            x (torch.tensor): inputs, shape (B, T, D)
+            h (torch.tensor): state after the previous time steps, shape (B, D, N)
+
+        Returns:
+            tuple[torch.tensor, torch.tensor]: output (B, T, D) and the state after
+            each time step (B, T, D, N)
+        """
+        A, delta, B, C = self._get_parameters(x)
+        with torch.autocast(device_type=x.device.type, enabled=False):
+            A_discrete, B_x = discretize(x.float(), delta, A, B.float())
+            h = sequential_scan(A_discrete, B_x, h)
+            y = (h @ C.float().unsqueeze(-1)).squeeze(3)
+
+        return y, h
+
+    @torch.no_grad()
+    def optimize_for_inference(self) -> None:
+        """Precompute A and merge the low rank projection of delta if it is cheaper
+
+        The merged projection costs D * D instead of 2 * D * rank operations, so it
+        is only used when the working dim is at most twice the rank.
+        """
+        self._A = -torch.exp(self._A_log.float())
+
+        rank = self._working_dim // self._fraction_d
+        if self._working_dim > 2 * rank:
+            return
+
+        weight, bias = self._DBC_proj.weight, self._DBC_proj.bias
+        DBC_proj = nn.Linear(
+            self._working_dim,
+            self._working_dim + 2 * self._state_dim,
+            device=weight.device,
+            dtype=weight.dtype,
+        )
+        DBC_proj.weight.copy_(
+            torch.cat([self._delta_up_rank.weight @ weight[:rank], weight[rank:]])
+        )
+        DBC_proj.bias.copy_(
+            torch.cat(
+                [
+                    self._delta_up_rank.weight @ bias[:rank] + self._delta_up_rank.bias,
+                    bias[rank:],
+                ]
+            )
+        )
+        self._DBC_proj = DBC_proj
+        self._delta_up_rank = nn.Identity()
+        self._fraction_d = 1
 
-    def forward(self, x: torch.tensor) -> torch.tensor:
+    def _get_parameters(
+        self, x: torch.tensor
+    ) -> tuple[torch.tensor, torch.tensor, torch.tensor, torch.tensor]:
         # Get A from parameters
-        A = -torch.exp(self._A_log.float())
+        A = self._A if self._A is not None else -torch.exp(self._A_log.float())
 
         # Get Delta, B and C from the projection of x (section 3.2)
         delta, B, C = self._DBC_proj(x).split(
@@ -179,26 +642,238 @@ class SelectiveStateSpaceModel(nn.Module):
             -1,
         )
         # Go back after the low rank (look paper, section 3.2 and 3.6)
-        delta = F.softplus(self._delta_up_rank(delta))
+        # From here on everything is kept in fp32, also under autocast
+        delta = F.softplus(self._delta_up_rank(delta).float())
+
+        return A, delta, B, C
+
+    def _selective_scan(
+        self,
+        x: torch.tensor,
+        delta: torch.tensor,
+        A: torch.tensor,
+        B: torch.tensor,
+        C: torch.tensor,
+        h0: Optional[torch.tensor] = None,
+    ) -> tuple[torch.tensor, torch.tensor]:
+        with torch.autocast(device_type=x.device.type, enabled=False):
+            x, B, C = x.float(), B.float(), C.float()
+            if self._scan_mode == "chunked":
+                return chunked_selective_scan(x, delta, A, B, C, self._chunk_size, h0)
+            if self._scan_mode == "recompute":
+                return recompute_selective_scan(x, delta, A, B, C, self._chunk_size, h0)
+            if self._scan_mode == "segsum":
+                return segsum_selective_scan(x, delta, A, B, C, self._chunk_size, h0)
+            if self._scan_mode == "fused":
+                return fused_selective_scan(x, delta, A, B, C, h0, self._chunk_size)
+
+            return selective_scan(
+                x, delta, A, B, C, h0, scan=SCAN_FUNCTIONS[self._scan_mode]
+            )
+
+
+class SSDBlock(nn.Module):
+    """Implementation of Mamba-2 Block, based on the structured state space duality
+
+    A is a scalar for each head and B, C are shared by all the heads, so the SSM
+    can be computed with matrix multiplications (look at ssd_scan).
 
-        # Look at "Discretization" in the section 2
-        A_discrete = torch.exp(delta.unsqueeze(-1) * A)
-        B_discrete = delta.unsqueeze(-1) * B.unsqueeze(2)
+    Args:
+        config (MiniMambaSSDBlockConfig): config of the SSD Block
+    """
 
-        # State Update
-        B_x = B_discrete * (x.unsqueeze(-1))
-        h_list = []
-        h = torch.zeros(x.shape[0], self._working_dim, self._state_dim, device=x.device)
-        # This can be parallalized in CUDA:
-        # https://developer.nvidia.com/gpugems/gpugems3/
-        # /part-vi-gpu-computing/chapter-39-parallel-prefix-sum-scan-cuda
-        for t in range(x.shape[1]):
-            h = A_discrete[:, t] * h + B_x[:, t]
-            h_list.append(h)
+    def __init__(self, config: MiniMambaSSDBlockConfig) -> None:
+        super().__init__()
+        working_dim = config.layer_input * config.expansion
+        num_heads = working_dim // config.head_dim
+        conv_dim = working_dim + 2 * config.state_dim
+        # Input norm
+        self._norm = (FusedRMSNorm if config.fused_ops else RMSNorm)(config.layer_input)
+        # Projection for gate, x, B, C and delta of each head
+        self._in_projection = nn.Linear(
+            config.layer_input, working_dim + conv_dim + num_heads
+        )
 
-        h_list = torch.stack(h_list, 1)
+        # Projection output, with residual connection if the dimension is unchanged
+        layer_out = (
+            config.layer_out if config.layer_out is not None else config.layer_input
+        )
+        self._out_projection = nn.Linear(working_dim, layer_out)
+        self._residual: bool = layer_out == config.layer_input
+        # In place norm and output epilogue when gradients are not needed
+        self._fused_ops: bool = config.fused_ops
 
-        # output update Y = C*H
-        y = (h_list @ C.unsqueeze(-1)).squeeze(3)
+        # Conv over x, B and C
+        self._conv = CausalDepthwiseConv1d(conv_dim, config.conv_kernel)
 
-        return y
+        # Mamba-2 initialization: A in [1, 16], delta in [1e-3, 1e-1]
+        A = torch.empty(num_heads).uniform_(1, 16)
+        self._A_log = nn.Parameter(torch.log(A))
+        self._A_log._no_weight_decay = True
+        delta = torch.exp(torch.empty(num_heads).uniform_(math.log(1e-3), math.log(1e-1)))
+        # Inverse of softplus
+        self._delta_bias = nn.Parameter(delta + torch.log(-torch.expm1(-delta)))
+        self._delta_bias._no_weight_decay = True
+        # A = -exp(A_log), precomputed by optimize_for_inference
+        self.register_buffer("_A", None, persistent=False)
+
+        self._working_dim: int = working_dim
+        self._num_heads: int = num_heads
+        self._head_dim: int = config.head_dim
+        self._state_dim: int = config.state_dim
+        self._chunk_size: int = config.chunk_size
+
+    def forward(
+        self,
+        x: torch.tensor,
+        return_state: bool = False,
+        state: Optional[MambaBlockState] = None,
+    ) -> Union[torch.tensor, tuple[torch.tensor, MambaBlockState]]:
+        residual = x
+        # Continue after the previous time steps if a state is given
+        conv_state, h0 = (None, None) if state is None else (state.conv, state.ssm)
+        # X shape: B, T, D
+        x = self._norm(x)
+
+        g, x, delta = self._in_projection(x).split(
+            [self._working_dim, self._conv.in_channels, self._num_heads], -1
+        )
+        if return_state:
+            new_conv_state = self._conv.tail(x, conv_state)
+
+        # Conv and activation of x, B and C
+        x = self._conv(x, conv_state)
+        x = F.silu(x)
+
+        # SSM
+        x, ssm_state = self._ssd(x, delta, h0)
+
+        # Gate and projection
+        x = gated_projection(
+            x,
+            g,
+            self._out_projection,
+            residual if self._residual else None,
+            self._fused_ops,
+        )
+
+        if return_state:
+            return x, MambaBlockState(conv=new_conv_state, ssm=ssm_state)
+
+        return x
+
+    def step(
+        self, x: torch.tensor, state: MambaBlockState
+    ) -> tuple[torch.tensor, MambaBlockState]:
+        """Process a single time step, look at forward for the details
+
+        Args:
+            x (torch.tensor): input of the current time step, shape (B, D)
+            state (MambaBlockState): state after the previous time steps
+
+        Returns:
+            tuple[torch.tensor, MambaBlockState]: output (B, D) and updated state
+        """
+        residual = x
+        x = self._norm(x)
+        g, x, delta = self._in_projection(x).split(
+            [self._working_dim, self._conv.in_channels, self._num_heads], -1
+        )
+
+        x, conv_state = self._conv.step(x, state.conv)
+        x = F.silu(x)
+
+        x, ssm_state = self._ssd(x.unsqueeze(1), delta.unsqueeze(1), state.ssm)
+        x = x[:, 0]
+
+        x = gated_projection(
+            x,
+            g,
+            self._out_projection,
+            residual if self._residual else None,
+            self._fused_ops,
+        )
+
+        return x, MambaBlockState(conv=conv_state, ssm=ssm_state)
+
+    def extend(
+        self, x: torch.tensor, state: MambaBlockState
+    ) -> tuple[torch.tensor, MambaBlockState]:
+        """Process a few time steps after state, keeping the state after each one
+
+        Args:
+            x (torch.tensor): inputs, shape (B, T, D)
+            state (MambaBlockState): state after the previous time steps
+
+        Returns:
+            tuple[torch.tensor, MambaBlockState]: output (B, T, D) and states with
+            the time at dim 1
+        """
+        residual = x
+        x = self._norm(x)
+        g, x, delta = self._in_projection(x).split(
+            [self._working_dim, self._conv.in_channels, self._num_heads], -1
+        )
+
+        x, conv_states = self._conv.extend(x, state.conv)
+        x = F.silu(x)
+
+        x, ssm_states = self._ssd(x, delta, state.ssm, all_states=True)
+
+        x = gated_projection(
+            x,
+            g,
+            self._out_projection,
+            residual if self._residual else None,
+            self._fused_ops,
+        )
+
+        return x, MambaBlockState(conv=conv_states, ssm=ssm_states)
+
+    def init_state(self, batch_size: int) -> MambaBlockState:
+        """Create the state of an empty sequence
+
+        Args:
+            batch_size (int): number of sequences
+
+        Returns:
+            MambaBlockState: zero state
+        """
+        weight = self._conv.weight
+        return MambaBlockState(
+            conv=weight.new_zeros(
+                batch_size, self._conv.kernel_size[0] - 1, weight.shape[0]
+            ),
+            ssm=weight.new_zeros(
+                batch_size, self._num_heads, self._head_dim, self._state_dim
+            ),
+        )
+
+    @torch.no_grad()
+    def optimize_for_inference(self) -> None:
+        """Fold the scale of the norm into the input projection and precompute A"""
+        self._norm.fold_scale(self._in_projection)
+        self._A = -torch.exp(self._A_log.float())
+
+    def _ssd(
+        self,
+        x: torch.tensor,
+        delta: torch.tensor,
+        h0: Optional[torch.tensor] = None,
+        all_states: bool = False,
+    ) -> tuple[torch.tensor, torch.tensor]:
+        x, B, C = x.split([self._working_dim, self._state_dim, self._state_dim], -1)
+        x = x.unflatten(-1, (self._num_heads, self._head_dim))
+        A = self._A if self._A is not None else -torch.exp(self._A_log.float())
+        delta = F.softplus(delta.float() + self._delta_bias)
+
+        # The discretization and the recurrence are kept in fp32, also under autocast
+        with torch.autocast(device_type=x.device.type, enabled=False):
+            if all_states:
+                y, h = ssd_states(x.float(), delta, A, B.float(), C.float(), h0)
+            else:
+                y, h = ssd_scan(
+                    x.float(), delta, A, B.float(), C.float(), self._chunk_size, h0
+                )
+
+        return y.flatten(-2), h
@@ -0,0 +1,19 @@
+import torch
+from torch import nn
+
+from minimamba.models.mini_mamba import MiniMamba
+
+
+def quantize_dynamic_int8(model: MiniMamba) -> MiniMamba:
+    """Quantize all the linear layers of a model to int8 for CPU inference
+
+    The weights are stored in int8 and the activations are quantized on the fly,
+    the outputs of the layers are fp32 so the SSM recurrence is unchanged.
+
+    Args:
+        model (MiniMamba): model to be quantized, it is not modified
+
+    Returns:
+        MiniMamba: quantized copy of the model
+    """
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
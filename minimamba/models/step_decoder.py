@@ -0,0 +1,67 @@
+import json
+
+import torch
+from torch import nn
+
+from minimamba.deploy.exported_decoder import METADATA_FILE
+from minimamba.models.mini_mamba import MambaBlockState, MiniMamba
+
+
+class StepDecoder(nn.Module):
+    """Single token decoder of MiniMamba with the states as plain tensors
+
+    The states of the blocks are flattened as [conv_0, ssm_0, conv_1, ssm_1, ...]
+    so the module can be traced by torch.export.
+
+    Args:
+        model (MiniMamba): model to be wrapped
+    """
+
+    def __init__(self, model: MiniMamba) -> None:
+        super().__init__()
+        self._model = model
+
+    def forward(
+        self, idx: torch.tensor, states: list[torch.tensor]
+    ) -> tuple[torch.tensor, list[torch.tensor]]:
+        block_states = [
+            MambaBlockState(conv=conv, ssm=ssm)
+            for conv, ssm in zip(states[::2], states[1::2])
+        ]
+        logits, block_states = self._model.step(idx, block_states)
+
+        return logits, flatten_states(block_states)
+
+
+def flatten_states(states: list[MambaBlockState]) -> list[torch.tensor]:
+    """Flatten the states of the blocks as [conv_0, ssm_0, conv_1, ssm_1, ...]
+
+    Args:
+        states (list[MambaBlockState]): states of the blocks
+
+    Returns:
+        list[torch.tensor]: flattened states
+    """
+    return [tensor for state in states for tensor in (state.conv, state.ssm)]
+
+
+def export_decoder(model: MiniMamba, path: str, batch_size: int) -> None:
+    """Export the single token decoder of a model with torch.export
+
+    Args:
+        model (MiniMamba): model to be exported
+        path (str): where the program is saved, with the shapes of the states
+        batch_size (int): number of sequences decoded together
+    """
+    decoder = StepDecoder(model).eval()
+    idx = torch.zeros(batch_size, dtype=torch.long, device=model.device)
+    states = flatten_states(model.init_states(batch_size))
+    with torch.no_grad():
+        program = torch.export.export(decoder, (idx, states))
+
+    metadata = {
+        "batch_size": batch_size,
+        "state_shapes": [list(state.shape) for state in states],
+        "state_dtype": str(states[0].dtype).removeprefix("torch."),
+    }
+    torch.export.save(program, path, extra_files={METADATA_FILE: json.dumps(metadata)})
@@ -0,0 +1,98 @@
+from typing import Optional
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+
+class CausalDepthwiseConv1d(nn.Conv1d):
+    """Causal depthwise convolution working directly on (B, T, D) inputs
+
+    The output at time t only depends on the inputs up to t. It is computed as a
+    sum of shifted copies of the left padded input, one per kernel tap, so there
+    are no transposes and no outputs to be discarded. The parameters are the ones
+    of nn.Conv1d(channels, channels, kernel_size, groups=channels).
+
+    Args:
+        channels (int): number of channels
+        kernel_size (int): size of the kernel
+    """
+
+    def __init__(self, channels: int, kernel_size: int) -> None:
+        super().__init__(channels, channels, kernel_size, groups=channels)
+
+    def forward(
+        self, x: torch.tensor, conv_state: Optional[torch.tensor] = None
+    ) -> torch.tensor:
+        T = x.shape[1]
+        x = self._pad(x, conv_state)
+        y = self.bias
+        for k in range(self.kernel_size[0]):
+            y = y + self.weight[:, 0, k] * x[:, k : k + T]
+
+        return y
+
+    def tail(
+        self, x: torch.tensor, conv_state: Optional[torch.tensor] = None
+    ) -> torch.tensor:
+        """Get the last kernel_size - 1 inputs, zero padded for short sequences
+
+        Args:
+            x (torch.tensor): inputs, shape (B, T, D)
+            conv_state (Optional[torch.tensor]): inputs before x, shape
+                (B, kernel_size - 1, D), zeros if None
+
+        Returns:
+            torch.tensor: state of the conv after x, shape (B, kernel_size - 1, D)
+        """
+        x = self._pad(x, conv_state)
+        return x[:, x.shape[1] - self.kernel_size[0] + 1 :]
+
+    def step(
+        self, x: torch.tensor, conv_state: torch.tensor
+    ) -> tuple[torch.tensor, torch.tensor]:
+        """Process a single time step over the rolling buffer of the last inputs
+
+        Args:
+            x (torch.tensor): input of the current time step, shape (B, D)
+            conv_state (torch.tensor): previous inputs, shape (B, kernel_size - 1, D)
+
+        Returns:
+            tuple[torch.tensor, torch.tensor]: output (B, D) and updated state
+        """
+        window = torch.cat([conv_state, x.unsqueeze(1)], 1)
+        y = (window * self.weight[:, 0].T).sum(1) + self.bias
+
+        return y, window[:, 1:]
+
+    def extend(
+        self, x: torch.tensor, conv_state: torch.tensor
+    ) -> tuple[torch.tensor, torch.tensor]:
+        """Process a few time steps after the previous inputs, keeping every state
+
+        Args:
+            x (torch.tensor): inputs, shape (B, T, D)
+            conv_state (torch.tensor): previous inputs, shape (B, kernel_size - 1, D)
+
+        Returns:
+            tuple[torch.tensor, torch.tensor]: output (B, T, D) and state after each
+            time step (B, T, kernel_size - 1, D)
+        """
+        T = x.shape[1]
+        window = torch.cat([conv_state, x], 1)
+        y = self.bias
+        for k in range(self.kernel_size[0]):
+            y = y + self.weight[:, 0, k] * window[:, k : k + T]
+
+        states = torch.stack(
+            [window[:, t + 1 : t + self.kernel_size[0]] for t in range(T)], 1
+        )
+
+        return y, states
+
+    def _pad(self, x: torch.tensor, conv_state: Optional[torch.tensor]) -> torch.tensor:
+        # The previous inputs (or zeros) go before the first time step
+        if conv_state is None:
+            return F.pad(x, (0, 0, self.kernel_size[0] - 1, 0))
+
+        return torch.cat([conv_state, x], 1)
@@ -0,0 +1,116 @@
+from typing import Optional
+
+import torch
+import torch.nn.functional as F
+
+
+class ChunkedCrossEntropyFunction(torch.autograd.Function):
+    """Linear head followed by cross entropy, computed a chunk of tokens at a time
+
+    The logits of a chunk are reduced to the loss right away and recomputed during
+    backward, so the (tokens x vocab) logits and their gradient are never stored
+    for the whole batch. Under autocast the head runs in the autocast dtype in both
+    passes, so the gradients are the ones of the returned loss.
+    """
+
+    @staticmethod
+    def forward(
+        ctx,
+        x: torch.tensor,
+        weight: torch.tensor,
+        bias: Optional[torch.tensor],
+        target: torch.tensor,
+        chunk_size: int,
+        ignore_index: int,
+    ) -> torch.tensor:
+        ctx.save_for_backward(x, weight, bias, target)
+        ctx.chunk_size = chunk_size
+        ctx.ignore_index = ignore_index
+        device_type = x.device.type
+        if torch.is_autocast_enabled(device_type):
+            ctx.dtype = torch.get_autocast_dtype(device_type)
+        else:
+            ctx.dtype = torch.promote_types(x.dtype, weight.dtype)
+
+        losses = []
+        with torch.autocast(device_type=device_type, enabled=False):
+            weight_c, bias_c = _cast(weight, ctx.dtype), _cast(bias, ctx.dtype)
+            for start in range(0, x.shape[0], chunk_size):
+                chunk = slice(start, start + chunk_size)
+                logits = _logits(x[chunk].to(ctx.dtype), weight_c, bias_c)
+                losses.append(
+                    F.cross_entropy(
+                        logits, target[chunk], ignore_index=ignore_index, reduction="sum"
+                    )
+                )
+
+        # nan if all the targets are ignored, as F.cross_entropy
+        return torch.stack(losses).sum() / (target != ignore_index).sum()
+
+    @staticmethod
+    def backward(ctx, grad_loss: torch.tensor) -> tuple:
+        x, weight, bias, target = ctx.saved_tensors
+        valid = target != ctx.ignore_index
+        scale = grad_loss / valid.sum().clamp(min=1)
+
+        grad_x = torch.empty_like(x)
+        grad_weight = torch.zeros_like(weight)
+        grad_bias = torch.zeros_like(bias) if bias is not None else None
+        with torch.autocast(device_type=x.device.type, enabled=False):
+            weight_c, bias_c = _cast(weight, ctx.dtype), _cast(bias, ctx.dtype)
+            for start in range(0, x.shape[0], ctx.chunk_size):
+                chunk = slice(start, start + ctx.chunk_size)
+                x_c = x[chunk].to(ctx.dtype)
+
+                # d loss / d logits = softmax - one_hot(target), zero for ignored tokens
+                grad_logits = torch.softmax(_logits(x_c, weight_c, bias_c), -1)
+                rows = torch.arange(x_c.shape[0], device=x.device)
+                grad_logits[rows, target[chunk].clamp(min=0)] -= 1
+                grad_logits = grad_logits * (valid[chunk].unsqueeze(1) * scale)
+                grad_logits = grad_logits.to(ctx.dtype)
+
+                grad_x[chunk] = grad_logits @ weight_c
+                grad_weight += grad_logits.T @ x_c
+                if grad_bias is not None:
+                    grad_bias += grad_logits.sum(0)
+
+        return grad_x, grad_weight, grad_bias, None, None, None
+
+
+def _cast(tensor: Optional[torch.tensor], dtype: torch.dtype) -> Optional[torch.tensor]:
+    return tensor.to(dtype) if tensor is not None else None
+
+
+def _logits(
+    x: torch.tensor, weight: torch.tensor, bias: Optional[torch.tensor]
+) -> torch.tensor:
+    # The softmax is computed at least in fp32, also when the head runs in bf16
+    logits = F.linear(x, weight, bias)
+    return logits.to(torch.promote_types(logits.dtype, torch.float32))
+
+
+def chunked_cross_entropy(
+    x: torch.tensor,
+    weight: torch.tensor,
+    bias: Optional[torch.tensor],
+    target: torch.tensor,
+    chunk_size: int,
+    ignore_index: int = -100,
+) -> torch.tensor:
+    """Mean cross entropy of the linear head F.linear(x, weight, bias)
+
+    Args:
+        x (torch.tensor): input of the head, shape (tokens, D)
+        weight (torch.tensor): weight of the head, shape (V, D)
+        bias (Optional[torch.tensor]): bias of the head, shape (V,)
+        target (torch.tensor): target classes, shape (tokens,)
+        chunk_size (int): number of tokens whose logits are computed together
+        ignore_index (int): target value that does not contribute to the loss
+
+    Returns:
+        torch.tensor: mean loss over the tokens that are not ignored, nan if all of
+        them are ignored (the gradients are then zero)
+    """
+    return ChunkedCrossEntropyFunction.apply(
+        x, weight, bias, target, chunk_size, ignore_index
+    )
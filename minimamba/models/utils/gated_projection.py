@@ -0,0 +1,39 @@
+from typing import Optional
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+
+def gated_projection(
+    x: torch.tensor,
+    g: torch.tensor,
+    projection: nn.Module,
+    residual: Optional[torch.tensor] = None,
+    inplace: bool = False,
+) -> torch.tensor:
+    """Output epilogue of the blocks: projection(silu(g) * x) + residual
+
+    Args:
+        x (torch.tensor): output of the main branch
+        g (torch.tensor): output of the gated branch, before the activation
+        projection (nn.Module): output projection
+        residual (Optional[torch.tensor]): input of the block, if it is added back
+        inplace (bool): if True and gradients are not needed, the activation, the
+            gate and the residual add are computed in place, g is overwritten
+
+    Returns:
+        torch.tensor: output of the block
+    """
+    if inplace and not torch.is_grad_enabled():
+        x = projection(F.silu(g, inplace=True).mul_(x))
+        # In place only if it does not lower the precision of the residual
+        if residual is not None and residual.dtype == x.dtype:
+            return x.add_(residual)
+    else:
+        x = projection(F.silu(g) * x)
+
+    if residual is not None:
+        x = x + residual
+
+    return x
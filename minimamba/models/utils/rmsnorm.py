@@ -16,9 +16,47 @@ class RMSNorm(nn.Module):
         self._eps: float = eps
 
     def forward(self, x: torch.tensor) -> torch.tensor:
-        y = (
-            x
-            * torch.rsqrt(torch.mean(x**2, -1).unsqueeze(-1) + self._eps)
-            * self._scale
-        )
+        y = x * torch.rsqrt(torch.mean(x**2, -1).unsqueeze(-1) + self._eps)
+        if self._scale is not None:
+            y = y * self._scale
+        return y
+
+    @torch.no_grad()
+    def fold_scale(self, linear: nn.Linear) -> None:
+        """Fold the scale into the weights of the linear layer applied after the norm
+
+        Args:
+            linear (nn.Linear): layer that receives the output of the norm
+        """
+        linear.weight.mul_(self._scale)
+        self._scale = None
+
+
+class FusedRMSNorm(RMSNorm):
+    """RMSNorm that reuses its temporaries when gradients are not needed
+
+    Without autograd the mean square is computed from the norm along the last
+    dimension, without building the squares, and the scale is applied in place on
+    the output, so only one tensor of the size of x is allocated.
+    With gradients it falls back to RMSNorm. The parameters are the ones of RMSNorm.
+
+    Args:
+        dimension (int): size of the layer to be normalized
+        eps (float): epsilon for avoiding division by zero
+    """
+
+    def forward(self, x: torch.tensor) -> torch.tensor:
+        if torch.is_grad_enabled():
+            return super().forward(x)
+
+        norm = torch.linalg.vector_norm(x, dim=-1, keepdim=True)
+        y = norm.square_().div_(x.shape[-1]).add_(self._eps).rsqrt_()
+        y = x * y
+        if self._scale is not None:
+            # In place only if the output keeps the dtype of RMSNorm, a bf16 input
+            # times the fp32 scale is promoted to fp32
+            if torch.result_type(y, self._scale) == y.dtype:
+                y.mul_(self._scale)
+            else:
+                y = y * self._scale
         return y
@@ -0,0 +1,575 @@
+from typing import Callable, Optional
+
+import torch
+from torch.utils.checkpoint import checkpoint
+
+
+def sequential_scan(
+    A_discrete: torch.tensor, B_x: torch.tensor, h0: Optional[torch.tensor] = None
+) -> torch.tensor:
+    """Compute the recurrence h_t = A_t * h_{t-1} + Bx_t one step at a time
+
+    Args:
+        A_discrete (torch.tensor): discretized A, shape (B, T, D, N)
+        B_x (torch.tensor): discretized B times the input, shape (B, T, D, N)
+        h0 (Optional[torch.tensor]): initial state (B, D, N), zeros if None
+
+    Returns:
+        torch.tensor: all the states, shape (B, T, D, N)
+    """
+    h = torch.zeros_like(B_x[:, 0]) if h0 is None else h0
+    h_list = []
+    for t in range(B_x.shape[1]):
+        h = A_discrete[:, t] * h + B_x[:, t]
+        h_list.append(h)
+
+    return torch.stack(h_list, 1)
+
+
+def parallel_scan(
+    A_discrete: torch.tensor, B_x: torch.tensor, h0: Optional[torch.tensor] = None
+) -> torch.tensor:
+    """Compute the recurrence h_t = A_t * h_{t-1} + Bx_t with a Hillis-Steele scan
+
+    The pairs (A_t, Bx_t) are combined with the associative operator
+    (a1, b1) o (a2, b2) = (a1 * a2, a2 * b1 + b2), so all the prefixes are
+    obtained in log2(T) batched steps instead of T sequential ones:
+    https://developer.nvidia.com/gpugems/gpugems3/
+    /part-vi-gpu-computing/chapter-39-parallel-prefix-sum-scan-cuda
+
+    Args:
+        A_discrete (torch.tensor): discretized A, shape (B, T, D, N)
+        B_x (torch.tensor): discretized B times the input, shape (B, T, D, N)
+        h0 (Optional[torch.tensor]): initial state (B, D, N), zeros if None
+
+    Returns:
+        torch.tensor: all the states, shape (B, T, D, N)
+    """
+    a, b = A_discrete, B_x
+    T = b.shape[1]
+    offset = 1
+    while offset < T:
+        # Shift by offset, padding with the identity element (1, 0)
+        a_prev = torch.cat([torch.ones_like(a[:, :offset]), a[:, :-offset]], 1)
+        b_prev = torch.cat([torch.zeros_like(b[:, :offset]), b[:, :-offset]], 1)
+        b = a * b_prev + b
+        a = a * a_prev
+        offset *= 2
+
+    # a now holds the cumulative product of A, that propagates the initial state
+    if h0 is not None:
+        b = b + a * h0.unsqueeze(1)
+
+    return b
+
+
+SCAN_FUNCTIONS = {
+    "sequential": sequential_scan,
+    "parallel": parallel_scan,
+}
+
+
+def discretize(
+    x: torch.tensor, delta: torch.tensor, A: torch.tensor, B: torch.tensor
+) -> tuple[torch.tensor, torch.tensor]:
+    """Discretize A and B with the step delta, look at "Discretization" in section 2
+
+    Args:
+        x (torch.tensor): input of the SSM, shape (B, T, D)
+        delta (torch.tensor): step of the discretization, shape (B, T, D)
+        A (torch.tensor): continuous A, shape (D, N)
+        B (torch.tensor): input dependent B, shape (B, T, N)
+
+    Returns:
+        tuple[torch.tensor, torch.tensor]: A_discrete and B_discrete * x,
+        both of shape (B, T, D, N)
+    """
+    A_discrete = torch.exp(delta.unsqueeze(-1) * A)
+    B_discrete = delta.unsqueeze(-1) * B.unsqueeze(2)
+    B_x = B_discrete * (x.unsqueeze(-1))
+
+    return A_discrete, B_x
+
+
+def selective_scan(
+    x: torch.tensor,
+    delta: torch.tensor,
+    A: torch.tensor,
+    B: torch.tensor,
+    C: torch.tensor,
+    h0: Optional[torch.tensor] = None,
+    scan: Callable = sequential_scan,
+) -> tuple[torch.tensor, torch.tensor]:
+    """Run the selective SSM over the whole sequence at once
+
+    Args:
+        x (torch.tensor): input of the SSM, shape (B, T, D)
+        delta (torch.tensor): step of the discretization, shape (B, T, D)
+        A (torch.tensor): continuous A, shape (D, N)
+        B (torch.tensor): input dependent B, shape (B, T, N)
+        C (torch.tensor): input dependent C, shape (B, T, N)
+        h0 (Optional[torch.tensor]): initial state (B, D, N), zeros if None
+        scan (Callable): function computing the states from A_discrete and B_x
+
+    Returns:
+        tuple[torch.tensor, torch.tensor]: output (B, T, D) and last state (B, D, N)
+    """
+    A_discrete, B_x = discretize(x, delta, A, B)
+    h_list = scan(A_discrete, B_x, h0)
+
+    # output update Y = C*H
+    y = (h_list @ C.unsqueeze(-1)).squeeze(3)
+
+    return y, h_list[:, -1]
+
+
+def fused_selective_scan(
+    x: torch.tensor,
+    delta: torch.tensor,
+    A: torch.tensor,
+    B: torch.tensor,
+    C: torch.tensor,
+    h0: Optional[torch.tensor] = None,
+    chunk_size: int = 64,
+) -> tuple[torch.tensor, torch.tensor]:
+    """Run the selective SSM discretizing inside the recurrence
+
+    exp(delta_t * A) and delta_t * B_t * x_t are computed at each time step and the
+    state is contracted with C_t right away, so only (B, D, N) temporaries for the
+    current time step are allocated. Autograd would keep the temporaries of every
+    time step, so when gradients are needed the scan runs inside
+    FusedSelectiveScanFunction, whose backward is a time step by time step pass as
+    well. Unlike "recompute", no (B, T, D, N) or (B, chunk_size, D, N) tensor is
+    built, at the price of a sequential loop over time.
+
+    Args:
+        x (torch.tensor): input of the SSM, shape (B, T, D)
+        delta (torch.tensor): step of the discretization, shape (B, T, D)
+        A (torch.tensor): continuous A, shape (D, N)
+        B (torch.tensor): input dependent B, shape (B, T, N)
+        C (torch.tensor): input dependent C, shape (B, T, N)
+        h0 (Optional[torch.tensor]): initial state (B, D, N), zeros if None
+        chunk_size (int): distance between the states kept for backward
+
+    Returns:
+        tuple[torch.tensor, torch.tensor]: output (B, T, D) and last state (B, D, N)
+    """
+    if torch.is_grad_enabled():
+        return FusedSelectiveScanFunction.apply(x, delta, A, B, C, h0, chunk_size)
+
+    return _fused_scan(x, delta, A, B, C, h0)
+
+
+def _fused_scan(
+    x: torch.tensor,
+    delta: torch.tensor,
+    A: torch.tensor,
+    B: torch.tensor,
+    C: torch.tensor,
+    h0: Optional[torch.tensor],
+) -> tuple[torch.tensor, torch.tensor]:
+    h = x.new_zeros(x.shape[0], *A.shape) if h0 is None else h0
+    u = delta * x
+    y_list = []
+    for t in range(x.shape[1]):
+        h = torch.exp(delta[:, t, :, None] * A) * h + u[:, t, :, None] * B[:, t, None]
+        y_list.append((h @ C[:, t, :, None]).squeeze(2))
+
+    return torch.stack(y_list, 1), h
+
+
+def chunked_selective_scan(
+    x: torch.tensor,
+    delta: torch.tensor,
+    A: torch.tensor,
+    B: torch.tensor,
+    C: torch.tensor,
+    chunk_size: int,
+    h0: Optional[torch.tensor] = None,
+) -> tuple[torch.tensor, torch.tensor]:
+    """Run the selective SSM chunk by chunk, carrying only the boundary state
+
+    The (B, T, D, N) tensors are only built for one chunk at a time and contracted
+    with C right away. When gradients are needed each chunk is checkpointed, so
+    backward recomputes its states instead of keeping them for the whole sequence.
+
+    Args:
+        x (torch.tensor): input of the SSM, shape (B, T, D)
+        delta (torch.tensor): step of the discretization, shape (B, T, D)
+        A (torch.tensor): continuous A, shape (D, N)
+        B (torch.tensor): input dependent B, shape (B, T, N)
+        C (torch.tensor): input dependent C, shape (B, T, N)
+        chunk_size (int): number of time steps processed together
+        h0 (Optional[torch.tensor]): initial state (B, D, N), zeros if None
+
+    Returns:
+        tuple[torch.tensor, torch.tensor]: output (B, T, D) and last state (B, D, N)
+    """
+    h = x.new_zeros(x.shape[0], *A.shape) if h0 is None else h0
+    y_list = []
+    for start in range(0, x.shape[1], chunk_size):
+        chunk = slice(start, start + chunk_size)
+        args = (x[:, chunk], delta[:, chunk], A, B[:, chunk], C[:, chunk], h)
+        if torch.is_grad_enabled():
+            y, h = checkpoint(_scan_chunk, *args, use_reentrant=False)
+        else:
+            y, h = _scan_chunk(*args)
+        y_list.append(y)
+
+    return torch.cat(y_list, 1), h
+
+
+def _scan_chunk(
+    x: torch.tensor,
+    delta: torch.tensor,
+    A: torch.tensor,
+    B: torch.tensor,
+    C: torch.tensor,
+    h0: torch.tensor,
+) -> tuple[torch.tensor, torch.tensor]:
+    return selective_scan(x, delta, A, B, C, h0, scan=parallel_scan)
+
+
+def segsum(a: torch.tensor) -> torch.tensor:
+    """Compute the segment sums of a along the last dimension
+
+    The result is sum_{k=s+1}^{t} a_k at position [..., t, s] for s <= t and -inf
+    above the diagonal. The sums are taken over masked copies of a instead of
+    differences of a cumulative sum, to avoid cancellation in fp32.
+
+    Args:
+        a (torch.tensor): values to be summed, shape (..., L)
+
+    Returns:
+        torch.tensor: segment sums, shape (..., L, L)
+    """
+    L = a.shape[-1]
+    a = a.unsqueeze(-1).expand(*a.shape, L)
+    mask = torch.tril(torch.ones(L, L, dtype=torch.bool, device=a.device), -1)
+    a = a.masked_fill(~mask, 0)
+    a_segsum = torch.cumsum(a, -2)
+    mask = torch.tril(torch.ones(L, L, dtype=torch.bool, device=a.device), 0)
+    return a_segsum.masked_fill(~mask, -torch.inf)
+
+
+def segsum_selective_scan(
+    x: torch.tensor,
+    delta: torch.tensor,
+    A: torch.tensor,
+    B: torch.tensor,
+    C: torch.tensor,
+    chunk_size: int,
+    h0: Optional[torch.tensor] = None,
+) -> tuple[torch.tensor, torch.tensor]:
+    """Run the selective SSM in closed form, chunk by chunk
+
+    Inside a chunk h_t = exp(S_t) * h0 + sum_{s<=t} exp(S_t - S_s) * Bx_s, where S
+    is the cumulative sum of delta*A. The decays exp(S_t - S_s) are built from the
+    segment sums in log space and the contractions with Bx and C are done with
+    batched matmuls instead of a loop over the time steps.
+
+    Args:
+        x (torch.tensor): input of the SSM, shape (B, T, D)
+        delta (torch.tensor): step of the discretization, shape (B, T, D)
+        A (torch.tensor): continuous A, shape (D, N)
+        B (torch.tensor): input dependent B, shape (B, T, N)
+        C (torch.tensor): input dependent C, shape (B, T, N)
+        chunk_size (int): number of time steps processed together
+        h0 (Optional[torch.tensor]): initial state (B, D, N), zeros if None
+
+    Returns:
+        tuple[torch.tensor, torch.tensor]: output (B, T, D) and last state (B, D, N)
+    """
+    h = x.new_zeros(x.shape[0], *A.shape) if h0 is None else h0
+    u = delta * x
+    y_list = []
+    for start in range(0, x.shape[1], chunk_size):
+        chunk = slice(start, start + chunk_size)
+        B_c, C_c, u_c = B[:, chunk], C[:, chunk], u[:, chunk]
+
+        # Log of A_discrete with the time as last dimension: (B, D, N, L)
+        A_log_discrete = (delta[:, chunk].unsqueeze(-1) * A).permute(0, 2, 3, 1)
+        decay = torch.exp(segsum(A_log_discrete))
+        decay_from_start = torch.exp(torch.cumsum(A_log_discrete, -1))
+
+        # Contributions of the inputs of the chunk and of the initial state
+        y = torch.einsum("btn,bdnts,bsn,bsd->btd", C_c, decay, B_c, u_c)
+        y = y + torch.einsum("btn,bdnt,bdn->btd", C_c, decay_from_start, h)
+        y_list.append(y)
+
+        h = decay_from_start[..., -1] * h + torch.einsum(
+            "bdns,bsn,bsd->bdn", decay[..., -1, :], B_c, u_c
+        )
+
+    return torch.cat(y_list, 1), h
+
+
+def ssd_scan(
+    x: torch.tensor,
+    delta: torch.tensor,
+    A: torch.tensor,
+    B: torch.tensor,
+    C: torch.tensor,
+    chunk_size: int,
+    h0: Optional[torch.tensor] = None,
+) -> tuple[torch.tensor, torch.tensor]:
+    """Run the SSM with a scalar A per head (Mamba-2), chunk by chunk
+
+    With a scalar decay per head the recurrence inside a chunk is the masked
+    "attention" Y = (C B^T * exp(segsum(delta*A))) (delta*X), so each chunk is
+    computed with matrix multiplications, and the states are only materialized
+    at the chunk boundaries.
+
+    Args:
+        x (torch.tensor): input of the SSM, shape (B, T, H, P)
+        delta (torch.tensor): step of the discretization, shape (B, T, H)
+        A (torch.tensor): continuous A, shape (H,)
+        B (torch.tensor): input dependent B shared by the heads, shape (B, T, N)
+        C (torch.tensor): input dependent C shared by the heads, shape (B, T, N)
+        chunk_size (int): number of time steps processed together
+        h0 (Optional[torch.tensor]): initial state (B, H, P, N), zeros if None
+
+    Returns:
+        tuple[torch.tensor, torch.tensor]: output (B, T, H, P) and last state
+        (B, H, P, N)
+    """
+    h = x.new_zeros(*x.shape[:1], *x.shape[2:], B.shape[-1]) if h0 is None else h0
+    x = x * delta.unsqueeze(-1)
+    A_log_discrete = delta * A
+    y_list = []
+    for start in range(0, x.shape[1], chunk_size):
+        chunk = slice(start, start + chunk_size)
+        # Heads before time: (B, H, L, P) and (B, H, L)
+        x_c = x[:, chunk].transpose(1, 2)
+        A_c = A_log_discrete[:, chunk].transpose(1, 2)
+        B_c, C_c = B[:, chunk], C[:, chunk]
+
+        decay = torch.exp(segsum(A_c))
+        decay_from_start = torch.exp(torch.cumsum(A_c, -1))
+
+        # Contributions of the inputs of the chunk and of the initial state
+        scores = (C_c @ B_c.transpose(1, 2)).unsqueeze(1) * decay
+        y = scores @ x_c
+        y = y + decay_from_start.unsqueeze(-1) * (C_c.unsqueeze(1) @ h.transpose(2, 3))
+        y_list.append(y.transpose(1, 2))
+
+        x_decayed = x_c * decay[..., -1, :].unsqueeze(-1)
+        h = decay_from_start[..., -1, None, None] * h + (
+            x_decayed.transpose(2, 3) @ B_c.unsqueeze(1)
+        )
+
+    return torch.cat(y_list, 1), h
+
+
+def ssd_states(
+    x: torch.tensor,
+    delta: torch.tensor,
+    A: torch.tensor,
+    B: torch.tensor,
+    C: torch.tensor,
+    h0: torch.tensor,
+) -> tuple[torch.tensor, torch.tensor]:
+    """Run the SSM with a scalar A per head one step at a time, keeping all the states
+
+    Meant for a few time steps after a known state, e.g. to verify draft tokens
+    and restart from any of them.
+
+    Args:
+        x (torch.tensor): input of the SSM, shape (B, T, H, P)
+        delta (torch.tensor): step of the discretization, shape (B, T, H)
+        A (torch.tensor): continuous A, shape (H,)
+        B (torch.tensor): input dependent B shared by the heads, shape (B, T, N)
+        C (torch.tensor): input dependent C shared by the heads, shape (B, T, N)
+        h0 (torch.tensor): initial state (B, H, P, N)
+
+    Returns:
+        tuple[torch.tensor, torch.tensor]: output (B, T, H, P) and all the states
+        (B, T, H, P, N)
+    """
+    A_discrete = torch.exp(delta * A)[..., None, None]
+    B_x = (delta.unsqueeze(-1) * x).unsqueeze(-1) * B[:, :, None, None]
+    h = sequential_scan(A_discrete, B_x, h0)
+    y = (h @ C[:, :, None, :, None]).squeeze(-1)
+
+    return y, h
+
+
+class SelectiveScanFunction(torch.autograd.Function):
+    """Selective scan that recomputes the states during backward
+
+    Only the inputs are saved for backward: the states are rebuilt chunk by chunk
+    from the boundary states and the gradients are accumulated with a reverse-time
+    scan of the adjoint dL/dh_t = dL/dy_t * C_t + A_discrete_{t+1} * dL/dh_{t+1}.
+    """
+
+    @staticmethod
+    def forward(
+        ctx,
+        x: torch.tensor,
+        delta: torch.tensor,
+        A: torch.tensor,
+        B: torch.tensor,
+        C: torch.tensor,
+        h0: Optional[torch.tensor],
+        chunk_size: int,
+    ) -> tuple[torch.tensor, torch.tensor]:
+        ctx.save_for_backward(x, delta, A, B, C, h0)
+        ctx.chunk_size = chunk_size
+        return chunked_selective_scan(x, delta, A, B, C, chunk_size, h0)
+
+    @staticmethod
+    def backward(ctx, grad_y: torch.tensor, grad_h_last: torch.tensor) -> tuple:
+        x, delta, A, B, C, h0 = ctx.saved_tensors
+        chunk_size: int = ctx.chunk_size
+        starts = list(range(0, x.shape[1], chunk_size))
+
+        # Recompute the states at the beginning of each chunk
+        h = x.new_zeros(x.shape[0], *A.shape) if h0 is None else h0
+        boundaries = []
+        for start in starts:
+            boundaries.append(h)
+            chunk = slice(start, start + chunk_size)
+            A_discrete, B_x = discretize(x[:, chunk], delta[:, chunk], A, B[:, chunk])
+            h = parallel_scan(A_discrete, B_x, h)[:, -1]
+
+        # Go back in time, carrying the gradient w.r.t. the last state of the chunk
+        grad_x, grad_delta, grad_B, grad_C = [], [], [], []
+        grad_A = torch.zeros_like(A)
+        grad_h = grad_h_last
+        for start, h_start in zip(reversed(starts), reversed(boundaries)):
+            chunk = slice(start, start + chunk_size)
+            x_c, delta_c = x[:, chunk], delta[:, chunk]
+            B_c, C_c = B[:, chunk], C[:, chunk]
+            A_discrete, B_x = discretize(x_c, delta_c, A, B_c)
+            h_list = parallel_scan(A_discrete, B_x, h_start)
+            h_prev = torch.cat([h_start.unsqueeze(1), h_list[:, :-1]], 1)
+
+            # Adjoint recurrence, solved as a forward scan on the flipped sequence
+            A_next = torch.cat([A_discrete[:, 1:], torch.ones_like(A_discrete[:, :1])], 1)
+            grad_h_from_y = grad_y[:, chunk].unsqueeze(-1) * C_c.unsqueeze(2)
+            grad_h_list = parallel_scan(A_next.flip(1), grad_h_from_y.flip(1), grad_h)
+            grad_h_list = grad_h_list.flip(1)
+            grad_h = A_discrete[:, 0] * grad_h_list[:, 0]
+
+            # Chain rule through y = C*H, exp(delta*A) and delta*B*x
+            grad_C.append((grad_y[:, chunk].unsqueeze(-1) * h_list).sum(2))
+            grad_A_delta = grad_h_list * h_prev * A_discrete
+            grad_h_B = (grad_h_list @ B_c.unsqueeze(-1)).squeeze(3)
+            grad_delta.append((grad_A_delta * A).sum(-1) + grad_h_B * x_c)
+            grad_x.append(grad_h_B * delta_c)
+            grad_B.append((grad_h_list * (delta_c * x_c).unsqueeze(-1)).sum(2))
+            grad_A = grad_A + (grad_A_delta * delta_c.unsqueeze(-1)).sum((0, 1))
+
+        return (
+            torch.cat(grad_x[::-1], 1),
+            torch.cat(grad_delta[::-1], 1),
+            grad_A,
+            torch.cat(grad_B[::-1], 1),
+            torch.cat(grad_C[::-1], 1),
+            grad_h if h0 is not None else None,
+            None,
+        )
+
+
+class FusedSelectiveScanFunction(torch.autograd.Function):
+    """Fused selective scan whose backward also runs one time step at a time
+
+    The forward keeps the inputs and the states at the beginning of each chunk.
+    The backward rebuilds the states of one chunk at a time with the fused
+    recurrence, then goes back in time accumulating the gradients of each time
+    step, so only (B, D, N) tensors are ever allocated.
+    """
+
+    @staticmethod
+    def forward(
+        ctx,
+        x: torch.tensor,
+        delta: torch.tensor,
+        A: torch.tensor,
+        B: torch.tensor,
+        C: torch.tensor,
+        h0: Optional[torch.tensor],
+        chunk_size: int,
+    ) -> tuple[torch.tensor, torch.tensor]:
+        h = x.new_zeros(x.shape[0], *A.shape) if h0 is None else h0
+        boundaries, y_list = [], []
+        for start in range(0, x.shape[1], chunk_size):
+            boundaries.append(h)
+            chunk = slice(start, start + chunk_size)
+            y, h = _fused_scan(
+                x[:, chunk], delta[:, chunk], A, B[:, chunk], C[:, chunk], h
+            )
+            y_list.append(y)
+
+        ctx.save_for_backward(x, delta, A, B, C, h0, *boundaries)
+        ctx.chunk_size = chunk_size
+        return torch.cat(y_list, 1), h
+
+    @staticmethod
+    def backward(ctx, grad_y: torch.tensor, grad_h_last: torch.tensor) -> tuple:
+        x, delta, A, B, C, h0, *boundaries = ctx.saved_tensors
+        chunk_size: int = ctx.chunk_size
+        u = delta * x
+        grad_x, grad_delta = torch.empty_like(x), torch.empty_like(delta)
+        grad_B, grad_C = torch.empty_like(B), torch.empty_like(C)
+        grad_A = torch.zeros_like(A)
+        grad_h = grad_h_last
+        for start, h_start in zip(
+            reversed(range(0, x.shape[1], chunk_size)), reversed(boundaries)
+        ):
+            # States of the chunk, h_list[i] is the state before the time step i
+            h_list = [h_start]
+            for t in range(start, min(start + chunk_size, x.shape[1])):
+                A_discrete = torch.exp(delta[:, t, :, None] * A)
+                h_list.append(A_discrete * h_list[-1] + u[:, t, :, None] * B[:, t, None])
+
+            for i in reversed(range(len(h_list) - 1)):
+                t = start + i
+                A_discrete = torch.exp(delta[:, t, :, None] * A)
+                # dL/dh_t = dL/dy_t * C_t + A_discrete_{t+1} * dL/dh_{t+1}
+                grad_h = grad_h + grad_y[:, t, :, None] * C[:, t, None]
+                grad_C[:, t] = (grad_y[:, t, :, None] * h_list[i + 1]).sum(1)
+                # Chain rule through exp(delta*A) and delta*B*x
+                grad_A_delta = grad_h * h_list[i] * A_discrete
+                grad_u = (grad_h @ B[:, t, :, None]).squeeze(2)
+                grad_delta[:, t] = (grad_A_delta * A).sum(-1) + grad_u * x[:, t]
+                grad_x[:, t] = grad_u * delta[:, t]
+                grad_B[:, t] = (grad_h * u[:, t, :, None]).sum(1)
+                grad_A = grad_A + (grad_A_delta * delta[:, t, :, None]).sum(0)
+                grad_h = A_discrete * grad_h
+
+        return (
+            grad_x,
+            grad_delta,
+            grad_A,
+            grad_B,
+            grad_C,
+            grad_h if h0 is not None else None,
+            None,
+        )
+
+
+def recompute_selective_scan(
+    x: torch.tensor,
+    delta: torch.tensor,
+    A: torch.tensor,
+    B: torch.tensor,
+    C: torch.tensor,
+    chunk_size: int,
+    h0: Optional[torch.tensor] = None,
+) -> tuple[torch.tensor, torch.tensor]:
+    """Run the selective SSM saving only its inputs for backward
+
+    Args:
+        x (torch.tensor): input of the SSM, shape (B, T, D)
+        delta (torch.tensor): step of the discretization, shape (B, T, D)
+        A (torch.tensor): continuous A, shape (D, N)
+        B (torch.tensor): input dependent B, shape (B, T, N)
+        C (torch.tensor): input dependent C, shape (B, T, N)
+        chunk_size (int): number of time steps recomputed together in backward
+        h0 (Optional[torch.tensor]): initial state (B, D, N), zeros if None
+
+    Returns:
+        tuple[torch.tensor, torch.tensor]: output (B, T, D) and last state (B, D, N)
+    """
+    return SelectiveScanFunction.apply(x, delta, A, B, C, h0, chunk_size)
@@ -0,0 +1,24 @@
+from typing import Callable, Optional
+
+import torch
+
+from minimamba.configs.models import CompileConfig
+
+
+def compile_if_configured(fn: Callable, config: Optional[CompileConfig]) -> Callable:
+    """Wrap a module or a function with torch.compile if a config is given
+
+    Args:
+        fn (Callable): module or function to be compiled
+        config (Optional[CompileConfig]): backend and mode of torch.compile,
+            fn is returned unchanged if None
+
+    Returns:
+        Callable: the compiled (or original) module or function
+    """
+    if config is None:
+        return fn
+
+    return torch.compile(
+        fn, backend=config.backend, mode=config.mode, fullgraph=config.fullgraph
+    )
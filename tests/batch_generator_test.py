@@ -0,0 +1,103 @@
+import pytest
+import torch
+
+from minimamba.generation.batch_generator import (
+    BatchGenerator,
+    GenerationRequest,
+    truncate_at_stop,
+)
+from minimamba.generation.prefix_cache import PrefixStateCache
+from minimamba.generation.tokenizer import CharTokenizer
+from minimamba.models.mini_mamba import MiniMamba
+
+
+def _reference_completion(
+    model: MiniMamba, tokenizer: CharTokenizer, request: GenerationRequest
+) -> str:
+    # Greedy decoding that recomputes the whole sequence at every token
+    idx = tokenizer.encode(request.prompt)
+    with torch.no_grad():
+        for _ in range(request.max_new_tokens):
+            logits = model(torch.tensor([idx]))
+            idx.append(logits[0, -1].argmax().item())
+
+    return tokenizer.decode(idx[len(request.prompt) :])
+
+
+class TestBatchGenerator:
+    @pytest.mark.parametrize("batch_size, sync_interval", [(1, 1), (2, 3), (8, 16)])
+    def test_matches_single_sequence_generation(
+        self, model, tokenizer, batch_size, sync_interval
+    ):
+        requests = [
+            GenerationRequest("abc", 5),
+            GenerationRequest("k", 9),
+            GenerationRequest("hijkabcde", 1),
+            GenerationRequest("bad", 0),
+            GenerationRequest("ajk", 7),
+        ]
+
+        generator = BatchGenerator(
+            model, tokenizer, batch_size, sync_interval=sync_interval
+        )
+        completions = generator.generate(requests)
+
+        assert completions == [
+            _reference_completion(model, tokenizer, request) for request in requests
+        ]
+
+    @pytest.mark.parametrize("sync_interval", [1, 5])
+    def test_stop_strings(self, model, tokenizer, sync_interval):
+        requests = [GenerationRequest("abc", 12), GenerationRequest("kkd", 12)]
+        generator = BatchGenerator(model, tokenizer, sync_interval=sync_interval)
+        completions = generator.generate(requests)
+        stops = [completion[4:6] for completion in completions]
+
+        stopped = generator.generate(
+            [
+                GenerationRequest(request.prompt, request.max_new_tokens, [stop])
+                for request, stop in zip(requests, stops)
+            ]
+        )
+
+        assert stopped == [
+            completion[: completion.find(stop)]
+            for completion, stop in zip(completions, stops)
+        ]
+
+    def test_top_k_one_is_greedy(self, sampling_config, model, tokenizer):
+        requests = [GenerationRequest("abc", 6), GenerationRequest("k", 4)]
+        sampling = sampling_config(temperature=1.0, top_k=1, seed=0)
+
+        completions = BatchGenerator(model, tokenizer, sampling=sampling).generate(
+            requests
+        )
+
+        assert completions == BatchGenerator(model, tokenizer).generate(requests)
+
+    def test_prefix_cache(self, model, tokenizer):
+        requests = [
+            GenerationRequest("abcdefg", 5),
+            GenerationRequest("abcdek", 6),
+            GenerationRequest("abcdefgh", 3),
+        ]
+        prefix_cache = PrefixStateCache(2**20, block_size=2)
+
+        completions = BatchGenerator(
+            model, tokenizer, batch_size=1, prefix_cache=prefix_cache
+        ).generate(requests)
+
+        assert completions == BatchGenerator(model, tokenizer).generate(requests)
+        assert (prefix_cache.hits, prefix_cache.misses) == (2, 1)
+
+
+class TestTruncateAtStop:
+    def test_cuts_at_first_stop_string(self):
+        stop = ["\n\n", "."]
+
+        assert truncate_at_stop("ab x.\n\ny", 6, stop) == ("ab x", True)
+        assert truncate_at_stop("ab x\n\ny.", 6, stop) == ("ab x", True)
+
+    def test_ignores_stop_strings_before_piece(self):
+        assert truncate_at_stop("a.bc", 2, ["."]) == ("a.bc", False)
+        assert truncate_at_stop("a.bc", 3, ["."]) == ("a", True)
@@ -0,0 +1,60 @@
+import itertools
+
+import pytest
+import torch
+
+from minimamba.generation.batch_generator import BatchGenerator, GenerationRequest
+from minimamba.generation.beam_search import BeamSearchGenerator
+
+REQUESTS = [
+    GenerationRequest("abc", 9),
+    GenerationRequest("k", 3),
+    GenerationRequest("hijkabcde", 1),
+    GenerationRequest("ajk", 12, ["ff"]),
+]
+
+
+class TestBeamSearchGenerator:
+    def test_single_beam_matches_greedy_generation(self, model, tokenizer):
+        generator = BeamSearchGenerator(model, tokenizer, num_beams=1)
+
+        assert generator.generate(REQUESTS) == BatchGenerator(model, tokenizer).generate(
+            REQUESTS
+        )
+
+    def test_all_beams_find_most_likely_continuation(self, model, tokenizer):
+        prompt = tokenizer.encode("abc")
+        vocab_size = tokenizer.vocab_size
+        # Score every continuation of 3 tokens with a full forward
+        continuations = torch.tensor(list(itertools.product(range(vocab_size), repeat=3)))
+        idx = torch.cat(
+            [torch.tensor(prompt).expand(len(continuations), -1), continuations], 1
+        )
+        with torch.no_grad():
+            log_probs = torch.log_softmax(model(idx[:, :-1]).float(), -1)
+        scores = (
+            log_probs[:, len(prompt) - 1 :]
+            .gather(-1, continuations.unsqueeze(-1))
+            .sum((1, 2))
+        )
+        expected = tokenizer.decode(continuations[scores.argmax()].tolist())
+
+        generator = BeamSearchGenerator(
+            model, tokenizer, num_beams=vocab_size**2, length_penalty=0.0
+        )
+
+        assert generator.generate([GenerationRequest("abc", 3)]) == [expected]
+
+    @pytest.mark.parametrize("early_stopping", [False, True])
+    def test_respects_stop_strings(self, model, tokenizer, early_stopping):
+        generator = BeamSearchGenerator(
+            model, tokenizer, num_beams=3, early_stopping=early_stopping
+        )
+
+        completions = generator.generate(
+            [GenerationRequest(prompt, 20, ["a", "b"]) for prompt in ["abc", "kk"]]
+        )
+
+        for completion in completions:
+            assert len(completion) <= 20
+            assert "a" not in completion and "b" not in completion
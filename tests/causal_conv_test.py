@@ -0,0 +1,58 @@
+import pytest
+import torch
+from torch import nn
+
+from minimamba.models.utils.causal_conv import CausalDepthwiseConv1d
+
+
+class TestCausalDepthwiseConv1d:
+    @pytest.mark.parametrize("kernel_size", [1, 4, 5])
+    def test_matches_padded_conv1d(self, kernel_size):
+        torch.manual_seed(0)
+        conv = nn.Conv1d(8, 8, kernel_size, padding=kernel_size - 1, groups=8)
+        causal_conv = CausalDepthwiseConv1d(8, kernel_size)
+        causal_conv.load_state_dict(conv.state_dict())
+        x = torch.randn(2, 7, 8)
+
+        expected = conv(x.transpose(1, 2))[..., : x.shape[1]].transpose(1, 2)
+
+        torch.testing.assert_close(causal_conv(x), expected)
+
+    @pytest.mark.parametrize("kernel_size", [1, 4])
+    def test_step_matches_forward(self, kernel_size):
+        torch.manual_seed(0)
+        conv = CausalDepthwiseConv1d(8, kernel_size)
+        x = torch.randn(2, 7, 8)
+
+        conv_state = conv.tail(x[:, :2])
+        outputs = []
+        for t in range(2, x.shape[1]):
+            y, conv_state = conv.step(x[:, t], conv_state)
+            outputs.append(y)
+
+        torch.testing.assert_close(torch.stack(outputs, 1), conv(x)[:, 2:])
+
+    @pytest.mark.parametrize("kernel_size", [1, 4])
+    def test_extend_matches_step(self, kernel_size):
+        torch.manual_seed(0)
+        conv = CausalDepthwiseConv1d(8, kernel_size)
+        x = torch.randn(2, 7, 8)
+
+        y, states = conv.extend(x[:, 2:], conv.tail(x[:, :2]))
+
+        conv_state = conv.tail(x[:, :2])
+        for t in range(2, x.shape[1]):
+            y_step, conv_state = conv.step(x[:, t], conv_state)
+            torch.testing.assert_close(y[:, t - 2], y_step)
+            torch.testing.assert_close(states[:, t - 2], conv_state)
+
+    @pytest.mark.parametrize("kernel_size", [1, 4])
+    def test_forward_from_state(self, kernel_size):
+        torch.manual_seed(0)
+        conv = CausalDepthwiseConv1d(8, kernel_size)
+        x = torch.randn(2, 7, 8)
+
+        conv_state = conv.tail(x[:, :3])
+
+        torch.testing.assert_close(conv(x[:, 3:], conv_state), conv(x)[:, 3:])
+        torch.testing.assert_close(conv.tail(x[:, 3:], conv_state), conv.tail(x))
@@ -0,0 +1,56 @@
+import pytest
+import torch
+import torch.nn.functional as F
+
+from minimamba.models.utils.chunked_cross_entropy import chunked_cross_entropy
+
+
+class TestChunkedCrossEntropy:
+    @pytest.mark.parametrize("chunk_size", [1, 7, 64])
+    def test_matches_cross_entropy(self, chunk_size):
+        torch.manual_seed(0)
+        x = torch.randn(20, 8, dtype=torch.float64, requires_grad=True)
+        weight = torch.randn(13, 8, dtype=torch.float64, requires_grad=True)
+        bias = torch.randn(13, dtype=torch.float64, requires_grad=True)
+        target = torch.randint(0, 13, (20,))
+        target[::3] = -1
+        inputs = (x, weight, bias)
+
+        loss = chunked_cross_entropy(x, weight, bias, target, chunk_size, -1)
+        grads = torch.autograd.grad(loss, inputs)
+        loss_ref = F.cross_entropy(F.linear(x, weight, bias), target, ignore_index=-1)
+        grads_ref = torch.autograd.grad(loss_ref, inputs)
+
+        torch.testing.assert_close(loss, loss_ref)
+        for grad, grad_ref in zip(grads, grads_ref):
+            torch.testing.assert_close(grad, grad_ref)
+
+    def test_bf16_autocast_matches_cross_entropy(self):
+        torch.manual_seed(0)
+        x = torch.randn(20, 8, requires_grad=True)
+        weight = torch.randn(13, 8, requires_grad=True)
+        bias = torch.randn(13, requires_grad=True)
+        target = torch.randint(0, 13, (20,))
+        inputs = (x, weight, bias)
+
+        with torch.autocast(device_type="cpu", dtype=torch.bfloat16):
+            loss = chunked_cross_entropy(x, weight, bias, target, 7)
+            logits_ref = F.linear(x, weight, bias).float()
+            loss_ref = F.cross_entropy(logits_ref, target)
+        grads = torch.autograd.grad(loss, inputs)
+        grads_ref = torch.autograd.grad(loss_ref, inputs)
+
+        torch.testing.assert_close(loss, loss_ref, rtol=1e-3, atol=1e-3)
+        for grad, grad_ref in zip(grads, grads_ref):
+            assert grad.dtype == grad_ref.dtype
+            torch.testing.assert_close(grad, grad_ref, rtol=2e-2, atol=2e-3)
+
+    def test_all_ignored_is_nan(self):
+        x = torch.randn(4, 8)
+        weight = torch.randn(13, 8)
+        target = torch.full((4,), -1)
+
+        loss = chunked_cross_entropy(x, weight, None, target, 3, -1)
+        loss_ref = F.cross_entropy(F.linear(x, weight), target, ignore_index=-1)
+
+        assert loss.isnan() and loss_ref.isnan()
@@ -0,0 +1,86 @@
+import pytest
+import torch
+
+from configmanager.core.constants import KEY_CONFIG_CLASS, KEY_CONFIG_TYPE, ConfigType
+from minimamba.configs.models import (
+    CompileConfig,
+    MiniMambaBlockConfig,
+    MiniMambaSSDBlockConfig,
+)
+from minimamba.models.mini_mamba import MiniMamba
+from minimamba.utils.compile import compile_if_configured
+
+
+def _compile_config(**params) -> CompileConfig:
+    return CompileConfig(
+        **{
+            KEY_CONFIG_TYPE: ConfigType.CONFIG_SIMPLE,
+            KEY_CONFIG_CLASS: "minimamba.configs.models.CompileConfig",
+        },
+        **params,
+    )
+
+
+class TestCompile:
+    def test_no_config_is_identity(self, model):
+        assert compile_if_configured(model, None) is model
+
+    @pytest.mark.parametrize(
+        "config_class, block_params",
+        [
+            (MiniMambaBlockConfig, {"scan_mode": "parallel"}),
+            (MiniMambaBlockConfig, {"scan_mode": "segsum", "chunk_size": 4}),
+            (MiniMambaSSDBlockConfig, {}),
+        ],
+    )
+    def test_fullgraph_matches_eager(self, model_config, config_class, block_params):
+        torch.manual_seed(0)
+        model = MiniMamba(model_config(config_class, **block_params)).eval()
+        # The eager backend still traces the whole graph, and fails on graph breaks
+        config = _compile_config(backend="eager", fullgraph=True)
+        forward = compile_if_configured(model, config)
+        step = compile_if_configured(model.step, config)
+        idx = torch.randint(0, 11, (2, 9))
+
+        with torch.no_grad():
+            logits = forward(idx)
+            next_logits, states = forward(idx, prefill=True)
+            step_logits, _ = step(idx[:, 0], states)
+            next_logits_ref, states_ref = model(idx, prefill=True)
+            step_logits_ref, _ = model.step(idx[:, 0], states_ref)
+
+            torch.testing.assert_close(logits, model(idx))
+            torch.testing.assert_close(next_logits, next_logits_ref)
+            torch.testing.assert_close(step_logits, step_logits_ref)
+
+    @pytest.mark.parametrize(
+        "config_class, block_params, loss_chunk_size",
+        [
+            (MiniMambaBlockConfig, {"scan_mode": "parallel"}, None),
+            (MiniMambaBlockConfig, {"scan_mode": "chunked", "chunk_size": 4}, 5),
+            (MiniMambaBlockConfig, {"scan_mode": "recompute", "chunk_size": 4}, None),
+            (MiniMambaBlockConfig, {"scan_mode": "segsum", "checkpoint": True}, 5),
+            (MiniMambaSSDBlockConfig, {"checkpoint": True}, 5),
+        ],
+    )
+    def test_training_gradients_match_eager(
+        self, model_config, config_class, block_params, loss_chunk_size
+    ):
+        torch.manual_seed(0)
+        config = model_config(config_class, **block_params).model_copy(
+            update={"loss_chunk_size": loss_chunk_size}
+        )
+        model = MiniMamba(config).train()
+        # aot_eager also traces the backward, through checkpoint and the custom
+        # autograd functions
+        loss_fn = compile_if_configured(model._loss, _compile_config(backend="aot_eager"))
+        batch = (torch.randint(0, 11, (2, 9)), torch.randint(0, 11, (2, 9)))
+
+        loss = loss_fn(batch)
+        grads = torch.autograd.grad(loss, list(model.parameters()))
+        loss_ref = model._loss(batch)
+        grads_ref = torch.autograd.grad(loss_ref, list(model.parameters()))
+
+        torch.testing.assert_close(loss, loss_ref)
+        for grad, grad_ref in zip(grads, grads_ref):
+            torch.testing.assert_close(grad, grad_ref, rtol=1e-4, atol=1e-5)
@@ -0,0 +1,103 @@
+from typing import Callable
+
+import pytest
+import torch
+
+from configmanager.core.constants import (
+    KEY_CONFIG_CLASS,
+    KEY_CONFIG_TYPE,
+    KEY_TARGET_CLASS,
+    ConfigType,
+)
+from configmanager.core.models import BaseConfig
+from minimamba.configs.models import (
+    MiniMambaBlockConfig,
+    MiniMambaConfig,
+    MiniMambaSSDBlockConfig,
+    SamplingConfig,
+)
+from minimamba.generation.tokenizer import CharTokenizer
+from minimamba.models.mini_mamba import MiniMamba
+
+BLOCK_PARAMS = {
+    MiniMambaBlockConfig: {"fraction_d": 4},
+    MiniMambaSSDBlockConfig: {"head_dim": 8, "chunk_size": 4},
+}
+
+
+def _block_config(config_class: type, **params) -> BaseConfig:
+    return config_class(
+        **{
+            KEY_CONFIG_TYPE: ConfigType.CONFIG_SIMPLE,
+            KEY_CONFIG_CLASS: f"{config_class.__module__}.{config_class.__name__}",
+        },
+        **params,
+    )
+
+
+def _model_config(
+    config_class: type = MiniMambaBlockConfig, **block_params
+) -> MiniMambaConfig:
+    block_params = {
+        "expansion": 2,
+        "conv_kernel": 4,
+        "state_dim": 4,
+        **BLOCK_PARAMS[config_class],
+        **block_params,
+    }
+    return MiniMambaConfig(
+        **{
+            KEY_CONFIG_TYPE: ConfigType.CONFIG_OBJECT,
+            KEY_CONFIG_CLASS: "minimamba.configs.models.MiniMambaConfig",
+            KEY_TARGET_CLASS: "minimamba.models.mini_mamba.MiniMamba",
+        },
+        blocks=[
+            _block_config(config_class, layer_input=16, **block_params),
+            _block_config(config_class, layer_input=16, layer_out=24, **block_params),
+            _block_config(config_class, layer_input=24, **block_params),
+        ],
+        lr=1e-3,
+        embedding_dim=8,
+        vocab_size=11,
+    )
+
+
+def _sampling_config(**params) -> SamplingConfig:
+    return SamplingConfig(
+        **{
+            KEY_CONFIG_TYPE: ConfigType.CONFIG_SIMPLE,
+            KEY_CONFIG_CLASS: "minimamba.configs.models.SamplingConfig",
+        },
+        **params,
+    )
+
+
+@pytest.fixture
+def block_config() -> Callable[..., BaseConfig]:
+    return _block_config
+
+
+@pytest.fixture
+def model_config() -> Callable[..., MiniMambaConfig]:
+    return _model_config
+
+
+@pytest.fixture
+def sampling_config() -> Callable[..., SamplingConfig]:
+    return _sampling_config
+
+
+@pytest.fixture(params=[MiniMambaBlockConfig, MiniMambaSSDBlockConfig])
+def config_class(request) -> type:
+    return request.param
+
+
+@pytest.fixture
+def model(config_class) -> MiniMamba:
+    torch.manual_seed(0)
+    return MiniMamba(_model_config(config_class)).eval()
+
+
+@pytest.fixture
+def tokenizer() -> CharTokenizer:
+    return CharTokenizer("abcdefghijk")
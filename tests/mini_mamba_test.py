@@ -0,0 +1,199 @@
+import copy
+
+import pytest
+import torch
+
+from minimamba.configs.models import MiniMambaBlockConfig, MiniMambaSSDBlockConfig
+from minimamba.deploy.exported_decoder import ExportedDecoder
+from minimamba.models.mini_mamba import MiniMamba, states_at
+from minimamba.models.step_decoder import export_decoder
+
+SCAN_MODES = ["sequential", "parallel", "chunked", "recompute", "segsum", "fused"]
+
+
+class TestMiniMamba:
+    def test_step_matches_forward(self, model):
+        idx = torch.randint(0, 11, (3, 9))
+        with torch.no_grad():
+            logits = model(idx)
+            states = model.init_states(3)
+            step_logits = []
+            for t in range(idx.shape[1]):
+                out, states = model.step(idx[:, t], states)
+                step_logits.append(out)
+
+        torch.testing.assert_close(
+            torch.stack(step_logits, 1), logits, rtol=1e-4, atol=1e-5
+        )
+
+    @pytest.mark.parametrize("prompt_length", [1, 2, 7])
+    def test_prefill_then_step_matches_forward(self, model, prompt_length):
+        idx = torch.randint(0, 11, (3, 9))
+        with torch.no_grad():
+            logits = model(idx)
+            out, states = model(idx[:, :prompt_length], prefill=True)
+            step_logits = [out]
+            for t in range(prompt_length, idx.shape[1]):
+                out, states = model.step(idx[:, t], states)
+                step_logits.append(out)
+
+        torch.testing.assert_close(
+            torch.stack(step_logits, 1),
+            logits[:, prompt_length - 1 :],
+            rtol=1e-4,
+            atol=1e-5,
+        )
+
+    @pytest.mark.parametrize(
+        "config_class, block_params",
+        [
+            (MiniMambaBlockConfig, {"scan_mode": mode, "chunk_size": 3})
+            for mode in SCAN_MODES
+        ]
+        + [(MiniMambaSSDBlockConfig, {})],
+    )
+    def test_prefill_from_states_matches_prefill(
+        self, model_config, config_class, block_params
+    ):
+        torch.manual_seed(0)
+        model = MiniMamba(model_config(config_class, **block_params)).eval()
+        idx = torch.randint(0, 11, (3, 9))
+        with torch.no_grad():
+            logits, states = model(idx, prefill=True)
+            _, prefix_states = model(idx[:, :5], prefill=True)
+            logits_resumed, states_resumed = model(
+                idx[:, 5:], prefill=True, states=prefix_states
+            )
+
+        torch.testing.assert_close(logits_resumed, logits, rtol=1e-4, atol=1e-5)
+        for state, state_resumed in zip(states, states_resumed):
+            torch.testing.assert_close(
+                state_resumed.conv, state.conv, rtol=1e-4, atol=1e-5
+            )
+            torch.testing.assert_close(state_resumed.ssm, state.ssm, rtol=1e-4, atol=1e-5)
+
+    def test_extend_matches_step(self, model):
+        idx = torch.randint(0, 11, (3, 9))
+        with torch.no_grad():
+            _, states = model(idx[:, :4], prefill=True)
+            logits, extend_states = model.extend(idx[:, 4:], states)
+            for t in range(4, idx.shape[1]):
+                out, states = model.step(idx[:, t], states)
+                positions = torch.full((3,), t - 4)
+
+                torch.testing.assert_close(logits[:, t - 4], out, rtol=1e-4, atol=1e-5)
+                for state, extend_state in zip(
+                    states, states_at(extend_states, positions)
+                ):
+                    for a, b in [
+                        (extend_state.conv, state.conv),
+                        (extend_state.ssm, state.ssm),
+                    ]:
+                        torch.testing.assert_close(a, b, rtol=1e-4, atol=1e-5)
+
+    def test_checkpoint_matches_gradients(self, model_config, config_class):
+        torch.manual_seed(0)
+        model = MiniMamba(model_config(config_class))
+        model_checkpoint = MiniMamba(model_config(config_class, checkpoint=True))
+        model_checkpoint.load_state_dict(model.state_dict())
+        idx = torch.randint(0, 11, (2, 6))
+
+        model(idx).sum().backward()
+        model_checkpoint(idx).sum().backward()
+
+        for param, param_checkpoint in zip(
+            model.parameters(), model_checkpoint.parameters()
+        ):
+            torch.testing.assert_close(param_checkpoint.grad, param.grad)
+
+    def test_fused_ops_match_forward(self, model_config, config_class):
+        torch.manual_seed(0)
+        model = MiniMamba(model_config(config_class)).eval()
+        model_fused = MiniMamba(model_config(config_class, fused_ops=True)).eval()
+        model_fused.load_state_dict(model.state_dict())
+        idx = torch.randint(0, 11, (2, 6))
+
+        with torch.no_grad():
+            logits = model(idx)
+            logits_fused = model_fused(idx)
+            out, _ = model.step(idx[:, 0])
+            out_fused, _ = model_fused.step(idx[:, 0])
+
+        torch.testing.assert_close(logits_fused, logits)
+        torch.testing.assert_close(out_fused, out)
+
+    @pytest.mark.parametrize(
+        "config_class, block_params",
+        [
+            (MiniMambaBlockConfig, {}),
+            (MiniMambaBlockConfig, {"fraction_d": 1}),
+            (MiniMambaSSDBlockConfig, {}),
+        ],
+    )
+    def test_optimize_for_inference_is_equivalent(
+        self, model_config, config_class, block_params
+    ):
+        torch.manual_seed(0)
+        model = MiniMamba(model_config(config_class, **block_params)).eval()
+        optimized = copy.deepcopy(model).optimize_for_inference()
+        idx = torch.randint(0, 11, (2, 6))
+
+        with torch.no_grad():
+            logits = model(idx)
+            logits_optimized = optimized(idx)
+            out, _ = model.step(idx[:, 0])
+            out_optimized, _ = optimized.step(idx[:, 0])
+
+        torch.testing.assert_close(logits_optimized, logits, rtol=1e-4, atol=1e-5)
+        torch.testing.assert_close(out_optimized, out, rtol=1e-4, atol=1e-5)
+
+    def test_ssd_head_dim_must_divide_working_dim(self, block_config):
+        with pytest.raises(ValueError):
+            block_config(
+                MiniMambaSSDBlockConfig,
+                layer_input=16,
+                expansion=2,
+                conv_kernel=4,
+                state_dim=4,
+                head_dim=5,
+            )
+
+    def test_bf16_autocast_keeps_ssm_in_fp32(self, model):
+        idx = torch.randint(0, 11, (2, 6))
+        with torch.no_grad():
+            logits = model(idx)
+            with torch.autocast(device_type="cpu", dtype=torch.bfloat16):
+                logits_bf16 = model(idx)
+                _, states = model(idx, prefill=True)
+
+        assert logits_bf16.dtype == torch.bfloat16
+        assert all(state.ssm.dtype == torch.float32 for state in states)
+        torch.testing.assert_close(logits_bf16.float(), logits, rtol=0.1, atol=0.1)
+
+    def test_exported_decoder_matches_model(self, model, tmp_path):
+        idx = torch.randint(0, 11, (2, 5))
+        export_decoder(model, str(tmp_path / "decoder.pt2"), batch_size=2)
+        with torch.no_grad():
+            logits, states = model(idx, prefill=True)
+            output_idx = [idx]
+            for _ in range(3):
+                next_idx = logits.argmax(-1)
+                output_idx.append(next_idx.unsqueeze(1))
+                logits, states = model.step(next_idx, states)
+
+        decoder = ExportedDecoder(str(tmp_path / "decoder.pt2"))
+        num_steps = 0
+        step = decoder.step
+
+        def counting_step(*args):
+            nonlocal num_steps
+            num_steps += 1
+            return step(*args)
+
+        decoder.step = counting_step
+
+        torch.testing.assert_close(decoder.generate(idx, 3), torch.cat(output_idx, 1))
+        # One step per prompt token and per new token except the last one
+        assert num_steps == 5 + 2
+        with pytest.raises(ValueError):
+            decoder.generate(idx[:, :0], 3)
@@ -0,0 +1,55 @@
+import torch
+
+from minimamba.generation.prefix_cache import PrefixStateCache
+from minimamba.models.mini_mamba import MiniMamba
+
+
+class _CountingForward:
+    # Forward of the model that counts the processed tokens
+    def __init__(self, model: MiniMamba) -> None:
+        self._model = model
+        self.num_tokens = 0
+
+    def __call__(self, idx: torch.tensor, **kwargs):
+        self.num_tokens += idx.shape[1]
+        return self._model(idx, **kwargs)
+
+
+class TestPrefixStateCache:
+    def test_matches_prefill(self, model):
+        cache = PrefixStateCache(2**20, block_size=4)
+        forward = _CountingForward(model)
+        preamble = [1, 2, 3, 4, 5, 6, 7, 8, 9]
+        prompts = [[*preamble, 1, 2], [*preamble, 3], preamble[:8], preamble[:3]]
+
+        with torch.no_grad():
+            for prompt in prompts:
+                logits, states = cache.prefill(forward, prompt, model.device)
+                logits_ref, states_ref = model(torch.tensor([prompt]), prefill=True)
+
+                torch.testing.assert_close(logits, logits_ref, rtol=1e-4, atol=1e-5)
+                for state, state_ref in zip(states, states_ref):
+                    torch.testing.assert_close(
+                        state.ssm, state_ref.ssm, rtol=1e-4, atol=1e-5
+                    )
+
+        # Only the first prompt processes the preamble, the third one is cached
+        assert forward.num_tokens == 11 + 2 + 0 + 3
+        assert (cache.hits, cache.misses) == (2, 2)
+        assert len(cache) == 2
+
+    def test_lru_eviction(self, model):
+        cache = PrefixStateCache(2**20, block_size=2)
+        with torch.no_grad():
+            cache.prefill(model, [1, 2], model.device)
+            entry_bytes = cache.num_bytes
+            cache = PrefixStateCache(2 * entry_bytes, block_size=2)
+            cache.prefill(model, [1, 2], model.device)
+            cache.prefill(model, [3, 4], model.device)
+            # [1, 2] is used again, so [3, 4] is the least recently used
+            cache.prefill(model, [1, 2], model.device)
+            cache.prefill(model, [5, 6], model.device)
+            cache.prefill(model, [3, 4], model.device)
+
+        assert cache.num_bytes <= 2 * entry_bytes
+        assert (cache.hits, cache.misses) == (1, 4)
@@ -0,0 +1,53 @@
+import math
+
+import torch
+from torch import nn
+from torch.ao.nn.quantized import dynamic as nnqd
+
+from minimamba.commands.quantization_report import _perplexity, _tokens_per_sec
+from minimamba.models.quantization import quantize_dynamic_int8
+
+
+def _relative_error(actual: torch.tensor, expected: torch.tensor) -> float:
+    return (torch.linalg.norm(actual - expected) / torch.linalg.norm(expected)).item()
+
+
+class TestQuantization:
+    def test_replaces_all_linear_layers(self, model):
+        num_linear = sum(isinstance(module, nn.Linear) for module in model.modules())
+        state_dict = {name: value.clone() for name, value in model.state_dict().items()}
+
+        quantized = quantize_dynamic_int8(model)
+
+        assert num_linear > 0
+        assert not any(type(module) is nn.Linear for module in quantized.modules())
+        assert num_linear == sum(
+            isinstance(module, nnqd.Linear) for module in quantized.modules()
+        )
+        # The source model keeps its fp32 layers and weights
+        assert num_linear == sum(type(module) is nn.Linear for module in model.modules())
+        for name, value in model.state_dict().items():
+            torch.testing.assert_close(value, state_dict[name])
+
+    def test_logits_close_to_fp32(self, model):
+        idx = torch.randint(0, 11, (2, 7))
+        quantized = quantize_dynamic_int8(model)
+
+        with torch.no_grad():
+            logits = model(idx)
+            logits_quantized = quantized(idx)
+            step_logits, _ = model.step(idx[:, 0], model.init_states(2))
+            step_logits_quantized, _ = quantized.step(idx[:, 0], quantized.init_states(2))
+
+        assert _relative_error(logits_quantized, logits) < 0.1
+        assert _relative_error(step_logits_quantized, step_logits) < 0.1
+
+    def test_report_metrics(self, model):
+        batches = [
+            (torch.randint(0, 11, (2, 6)), torch.randint(0, 11, (2, 6))) for _ in range(2)
+        ]
+
+        for report_model in [model, quantize_dynamic_int8(model)]:
+            perplexity = _perplexity(report_model, batches)
+            assert math.isfinite(perplexity) and perplexity >= 1
+            assert _tokens_per_sec(report_model, batch_size=2, num_tokens=3) > 0
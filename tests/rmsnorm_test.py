@@ -0,0 +1,29 @@
+import pytest
+import torch
+
+from minimamba.models.utils.rmsnorm import FusedRMSNorm, RMSNorm
+
+
+class TestFusedRMSNorm:
+    @pytest.mark.parametrize(
+        "dtype, tol", [(torch.float32, 1e-5), (torch.bfloat16, 2e-2)]
+    )
+    @pytest.mark.parametrize("folded", [False, True])
+    def test_matches_rmsnorm(self, dtype, tol, folded):
+        torch.manual_seed(0)
+        norm = RMSNorm(8)
+        fused_norm = FusedRMSNorm(8)
+        with torch.no_grad():
+            norm._scale.uniform_(0.5, 1.5)
+        fused_norm.load_state_dict(norm.state_dict())
+        if folded:
+            norm.fold_scale(torch.nn.Linear(8, 4))
+            fused_norm.fold_scale(torch.nn.Linear(8, 4))
+        x = torch.randn(2, 5, 8).to(dtype)
+
+        with torch.no_grad():
+            y = norm(x)
+            y_fused = fused_norm(x)
+
+        assert y_fused.dtype == y.dtype
+        torch.testing.assert_close(y_fused, y, rtol=tol, atol=tol)
@@ -0,0 +1,80 @@
+import pytest
+import torch
+
+from minimamba.generation.sampling import (
+    apply_repetition_penalty,
+    sample,
+    token_presence,
+    top_k_filter,
+    top_p_filter,
+)
+
+
+class TestSampling:
+    def test_greedy(self, sampling_config):
+        logits = torch.randn(4, 10)
+
+        assert torch.equal(sample(logits), logits.argmax(-1))
+        assert torch.equal(
+            sample(logits, sampling_config(temperature=0.0)), logits.argmax(-1)
+        )
+
+    def test_top_k_filter(self):
+        logits = torch.tensor([[1.0, 4.0, 3.0, 2.0], [0.0, -1.0, 5.0, 1.0]])
+
+        filtered = top_k_filter(logits, 2)
+
+        assert torch.equal(
+            torch.isfinite(filtered),
+            torch.tensor([[False, True, True, False], [False, False, True, True]]),
+        )
+        assert torch.equal(top_k_filter(logits, 10), logits)
+
+    def test_top_p_filter(self):
+        logits = torch.log(torch.tensor([[0.1, 0.6, 0.3], [0.5, 0.25, 0.25]]))
+
+        filtered = top_p_filter(logits, 0.8)
+
+        assert torch.equal(
+            torch.isfinite(filtered),
+            torch.tensor([[False, True, True], [True, True, True]]),
+        )
+        # The most likely token is kept even if it is above p alone
+        assert torch.isfinite(top_p_filter(logits, 0.1)).sum(-1).tolist() == [1, 1]
+
+    def test_repetition_penalty(self):
+        logits = torch.tensor([[2.0, -2.0, 1.0], [2.0, -2.0, 1.0]])
+        presence = token_presence([[0, 1], [2]], 3, logits.device)
+
+        penalized = apply_repetition_penalty(logits, presence, 2.0)
+
+        torch.testing.assert_close(
+            penalized, torch.tensor([[1.0, -4.0, 1.0], [2.0, -2.0, 0.5]])
+        )
+
+    @pytest.mark.parametrize("top_k, top_p", [(3, None), (None, 0.5), (3, 0.5)])
+    def test_samples_in_support(self, sampling_config, top_k, top_p):
+        torch.manual_seed(0)
+        logits = torch.randn(64, 20)
+        config = sampling_config(temperature=0.7, top_k=top_k, top_p=top_p)
+        allowed = logits.clone()
+        if top_k is not None:
+            allowed = top_k_filter(allowed, top_k)
+        if top_p is not None:
+            allowed = top_p_filter(allowed / 0.7, top_p)
+
+        idx = sample(logits, config)
+
+        assert idx.shape == (64,)
+        assert torch.isfinite(allowed.gather(1, idx.unsqueeze(1))).all()
+
+    def test_seeded_sampling_is_reproducible(self, sampling_config):
+        logits = torch.randn(8, 20)
+        config = sampling_config(temperature=1.5)
+
+        samples = [
+            sample(logits, config, generator=torch.Generator().manual_seed(3))
+            for _ in range(2)
+        ]
+
+        assert torch.equal(samples[0], samples[1])
@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from minimamba.generation.batch_generator import BatchGenerator, GenerationRequest
+from minimamba.generation.scheduler import ContinuousBatchScheduler
+
+REQUESTS = [
+    GenerationRequest("abc", 5),
+    GenerationRequest("k", 9),
+    GenerationRequest("hijkabcde", 1),
+    GenerationRequest("ajk", 7, ["c"]),
+    GenerationRequest("bbb", 4),
+]
+
+
+class TestContinuousBatchScheduler:
+    @pytest.mark.parametrize("max_batch_size", [1, 2, 8])
+    def test_matches_batch_generation(self, model, tokenizer, max_batch_size):
+        async def run() -> list[str]:
+            scheduler = ContinuousBatchScheduler(model, tokenizer, max_batch_size)
+            task = asyncio.create_task(scheduler.run())
+
+            async def submit(request: GenerationRequest, delay: float) -> str:
+                # Requests arrive while the others are being decoded
+                await asyncio.sleep(delay)
+                return (await scheduler.submit(request)).completion
+
+            completions = await asyncio.gather(
+                *[submit(request, 0.01 * i) for i, request in enumerate(REQUESTS)]
+            )
+            task.cancel()
+            return completions
+
+        completions = asyncio.run(run())
+
+        assert completions == BatchGenerator(model, tokenizer).generate(REQUESTS)
+
+    def test_cancelled_request_leaves_batch(self, model, tokenizer):
+        async def run() -> tuple[str, int]:
+            scheduler = ContinuousBatchScheduler(model, tokenizer)
+            task = asyncio.create_task(scheduler.run())
+            cancelled = asyncio.create_task(
+                scheduler.submit(GenerationRequest("abc", 100000))
+            )
+            await asyncio.sleep(0.05)
+            cancelled.cancel()
+
+            completion = (await scheduler.submit(REQUESTS[0])).completion
+            num_running = len(scheduler._running)
+            task.cancel()
+            return completion, num_running
+
+        completion, num_running = asyncio.run(run())
+
+        assert num_running == 0
+        assert [completion] == BatchGenerator(model, tokenizer).generate(REQUESTS[:1])
+
+    def test_invalid_prompt(self, model, tokenizer):
+        async def run() -> None:
+            scheduler = ContinuousBatchScheduler(model, tokenizer)
+            with pytest.raises(ValueError):
+                await scheduler.submit(GenerationRequest("xyz", 5))
+
+        asyncio.run(run())
@@ -0,0 +1,169 @@
+import pytest
+import torch
+
+import minimamba.models.utils.selective_scan as scan_module
+from minimamba.models.mini_mamba import SelectiveStateSpaceModel
+from minimamba.models.utils.selective_scan import (
+    fused_selective_scan,
+    parallel_scan,
+    recompute_selective_scan,
+    segsum,
+    selective_scan,
+    sequential_scan,
+    ssd_scan,
+)
+
+
+def _random_recurrence(T: int) -> tuple[torch.tensor, torch.tensor]:
+    torch.manual_seed(0)
+    A_discrete = torch.rand(2, T, 8, 4, dtype=torch.float64, requires_grad=True)
+    B_x = torch.randn(2, T, 8, 4, dtype=torch.float64, requires_grad=True)
+    return A_discrete, B_x
+
+
+class TestSelectiveScan:
+    @pytest.mark.parametrize("T", [1, 2, 7, 16, 33])
+    def test_parallel_matches_sequential(self, T):
+        A_discrete, B_x = _random_recurrence(T)
+        h0 = torch.randn(2, 8, 4, dtype=torch.float64)
+
+        h_seq = sequential_scan(A_discrete, B_x, h0)
+        grads_seq = torch.autograd.grad(h_seq.sum(), (A_discrete, B_x))
+        h_par = parallel_scan(A_discrete, B_x, h0)
+        grads_par = torch.autograd.grad(h_par.sum(), (A_discrete, B_x))
+
+        torch.testing.assert_close(h_par, h_seq)
+        for grad_par, grad_seq in zip(grads_par, grads_seq):
+            torch.testing.assert_close(grad_par, grad_seq)
+
+    @pytest.mark.parametrize("chunk_size", [3, 5, 16])
+    def test_recompute_gradcheck(self, chunk_size):
+        torch.manual_seed(0)
+        x = torch.randn(2, 11, 6, dtype=torch.float64, requires_grad=True)
+        delta = torch.rand(2, 11, 6, dtype=torch.float64, requires_grad=True)
+        A = -torch.rand(6, 3, dtype=torch.float64, requires_grad=True)
+        B = torch.randn(2, 11, 3, dtype=torch.float64, requires_grad=True)
+        C = torch.randn(2, 11, 3, dtype=torch.float64, requires_grad=True)
+        h0 = torch.randn(2, 6, 3, dtype=torch.float64, requires_grad=True)
+        inputs = (x, delta, A, B, C, h0)
+
+        assert torch.autograd.gradcheck(
+            lambda *args: recompute_selective_scan(*args[:5], chunk_size, args[5]),
+            inputs,
+        )
+
+        y, h_last = recompute_selective_scan(x, delta, A, B, C, chunk_size, h0)
+        grads = torch.autograd.grad(y.sum() + h_last.sum(), inputs)
+        y_ref, h_last_ref = selective_scan(x, delta, A, B, C, h0)
+        grads_ref = torch.autograd.grad(y_ref.sum() + h_last_ref.sum(), inputs)
+
+        torch.testing.assert_close(y, y_ref)
+        torch.testing.assert_close(h_last, h_last_ref)
+        for grad, grad_ref in zip(grads, grads_ref):
+            torch.testing.assert_close(grad, grad_ref)
+
+    def test_fused_saves_only_inputs(self):
+        torch.manual_seed(0)
+        x = torch.randn(2, 11, 6, dtype=torch.float64, requires_grad=True)
+        delta = torch.rand(2, 11, 6, dtype=torch.float64, requires_grad=True)
+        A = -torch.rand(6, 3, dtype=torch.float64, requires_grad=True)
+        B = torch.randn(2, 11, 3, dtype=torch.float64, requires_grad=True)
+        C = torch.randn(2, 11, 3, dtype=torch.float64, requires_grad=True)
+        h0 = torch.randn(2, 6, 3, dtype=torch.float64, requires_grad=True)
+        inputs = (x, delta, A, B, C, h0)
+
+        saved = []
+        with torch.autograd.graph.saved_tensors_hooks(
+            lambda tensor: saved.append(tensor) or tensor, lambda tensor: tensor
+        ):
+            y, h_last = fused_selective_scan(*inputs, chunk_size=4)
+        grads = torch.autograd.grad(y.sum() + h_last.sum(), inputs)
+        y_ref, h_last_ref = selective_scan(*inputs)
+        grads_ref = torch.autograd.grad(y_ref.sum() + h_last_ref.sum(), inputs)
+
+        # No state of the recurrence is kept for backward
+        assert all(tensor.dim() < 4 for tensor in saved)
+        torch.testing.assert_close(y, y_ref)
+        torch.testing.assert_close(h_last, h_last_ref)
+        for grad, grad_ref in zip(grads, grads_ref):
+            torch.testing.assert_close(grad, grad_ref)
+
+    @pytest.mark.parametrize("grad", [False, True])
+    def test_fused_and_recompute_code_paths(self, monkeypatch, grad):
+        # recompute scans the chunks in parallel, fused never builds chunk states
+        chunk_scans = []
+
+        def counting_parallel_scan(*args):
+            chunk_scans.append(args[0].shape)
+            return parallel_scan(*args)
+
+        monkeypatch.setattr(scan_module, "parallel_scan", counting_parallel_scan)
+        torch.manual_seed(0)
+        x = torch.randn(2, 11, 6, requires_grad=grad)
+        delta = torch.rand(2, 11, 6)
+        A = -torch.rand(6, 3)
+        B, C = torch.randn(2, 11, 3), torch.randn(2, 11, 3)
+
+        with torch.set_grad_enabled(grad):
+            y, _ = fused_selective_scan(x, delta, A, B, C, chunk_size=4)
+            if grad:
+                assert type(y.grad_fn).__name__ == "FusedSelectiveScanFunctionBackward"
+                y.sum().backward()
+            assert chunk_scans == []
+
+            y, _ = recompute_selective_scan(x, delta, A, B, C, 4)
+            if grad:
+                assert type(y.grad_fn).__name__ == "SelectiveScanFunctionBackward"
+                y.sum().backward()
+            assert chunk_scans and all(shape[1] <= 4 for shape in chunk_scans)
+
+    def test_segsum(self):
+        a = torch.randn(2, 5, dtype=torch.float64)
+        expected = torch.full((2, 5, 5), -torch.inf, dtype=torch.float64)
+        for t in range(5):
+            for s in range(t + 1):
+                expected[:, t, s] = a[:, s + 1 : t + 1].sum(-1)
+
+        torch.testing.assert_close(segsum(a), expected)
+
+    @pytest.mark.parametrize("chunk_size", [1, 4, 16])
+    def test_ssd_scan_matches_recurrence(self, chunk_size):
+        torch.manual_seed(0)
+        x = torch.randn(2, 10, 3, 5, dtype=torch.float64)
+        delta = torch.rand(2, 10, 3, dtype=torch.float64)
+        A = -torch.rand(3, dtype=torch.float64)
+        B = torch.randn(2, 10, 4, dtype=torch.float64)
+        C = torch.randn(2, 10, 4, dtype=torch.float64)
+        h0 = torch.randn(2, 3, 5, 4, dtype=torch.float64)
+
+        h = h0
+        y_ref = []
+        for t in range(x.shape[1]):
+            A_discrete = torch.exp(delta[:, t] * A)[..., None, None]
+            B_x = (delta[:, t, :, None] * x[:, t])[..., None] * B[:, t, None, None]
+            h = A_discrete * h + B_x
+            y_ref.append(h @ C[:, t, None, :, None])
+        y_ref = torch.stack(y_ref, 1).squeeze(-1)
+
+        y, h_last = ssd_scan(x, delta, A, B, C, chunk_size, h0)
+
+        torch.testing.assert_close(y, y_ref)
+        torch.testing.assert_close(h_last, h)
+
+    @pytest.mark.parametrize(
+        "scan_mode", ["parallel", "chunked", "recompute", "segsum", "fused"]
+    )
+    def test_ssm_modes_match_sequential(self, scan_mode):
+        torch.manual_seed(0)
+        reference = SelectiveStateSpaceModel(16, 4, 4)
+        model = SelectiveStateSpaceModel(16, 4, 4, scan_mode=scan_mode, chunk_size=6)
+        model.load_state_dict(reference.state_dict())
+        x = torch.randn(2, 20, 16, requires_grad=True)
+
+        y = model(x)
+        (grad,) = torch.autograd.grad(y.sum(), x)
+        y_ref = reference(x)
+        (grad_ref,) = torch.autograd.grad(y_ref.sum(), x)
+
+        torch.testing.assert_close(y, y_ref, rtol=1e-4, atol=1e-5)
+        torch.testing.assert_close(grad, grad_ref, rtol=1e-4, atol=1e-5)
@@ -0,0 +1,88 @@
+import pytest
+import torch
+
+from minimamba.generation.batch_generator import BatchGenerator, GenerationRequest
+from minimamba.generation.session_store import SessionStateStore, chat_turn
+from minimamba.models.mini_mamba import MiniMamba
+
+
+def _random_states(model: MiniMamba) -> list:
+    states = model.init_states(1)
+    for state in states:
+        state.conv.normal_()
+        state.ssm.normal_()
+    return states
+
+
+class TestSessionStateStore:
+    @pytest.mark.parametrize("half", [False, True])
+    def test_spill_and_reload(self, model, tmp_path, half):
+        store = SessionStateStore(
+            model, str(tmp_path / "arena.bin"), num_slots=4, max_hot_sessions=2, half=half
+        )
+        sessions = {f"session-{i}": _random_states(model) for i in range(5)}
+        for session_id, states in sessions.items():
+            store.put(session_id, states)
+
+        assert len(store) == 5
+        assert store.num_cold == 3
+        tolerance = {"rtol": 1e-3, "atol": 1e-3} if half else {}
+        for session_id, states in sessions.items():
+            for state, stored in zip(states, store.get(session_id)):
+                assert stored.ssm.dtype == torch.float32
+                torch.testing.assert_close(stored.conv, state.conv, **tolerance)
+                torch.testing.assert_close(stored.ssm, state.ssm, **tolerance)
+
+    def test_full_arena(self, model, tmp_path):
+        store = SessionStateStore(
+            model, str(tmp_path / "arena.bin"), num_slots=1, max_hot_sessions=1
+        )
+        store.put("a", _random_states(model))
+        store.put("b", _random_states(model))
+        store.remove("a")
+        store.put("c", _random_states(model))
+
+        with pytest.raises(RuntimeError):
+            store.put("d", _random_states(model))
+
+        assert "d" not in store
+        assert len(store) == 2 and store.num_cold == 1
+
+    def test_failing_spill_keeps_store_consistent(self, model, tmp_path):
+        class FailingSlots:
+            def __setitem__(self, index, value):
+                raise OSError("No space left on device")
+
+        store = SessionStateStore(
+            model, str(tmp_path / "arena.bin"), num_slots=2, max_hot_sessions=1
+        )
+        states = _random_states(model)
+        store.put("a", states)
+        slots, store._slots = store._slots, FailingSlots()
+
+        with pytest.raises(OSError):
+            store.put("b", _random_states(model))
+
+        assert "b" not in store
+        assert len(store) == 1 and store.num_cold == 0
+        store._slots = slots
+        store.put("b", _random_states(model))
+        assert store.num_cold == 1
+        for state, stored in zip(states, store.get("a")):
+            torch.testing.assert_close(stored.ssm, state.ssm)
+
+    def test_chat_turns_match_single_generation(self, model, tokenizer, tmp_path):
+        store = SessionStateStore(
+            model, str(tmp_path / "arena.bin"), num_slots=2, max_hot_sessions=1
+        )
+        generator = BatchGenerator(model, tokenizer)
+
+        first = chat_turn(model, tokenizer, store, "a", "abc", 4)
+        # Another session moves "a" to the arena
+        chat_turn(model, tokenizer, store, "b", "kk", 2)
+        second = chat_turn(model, tokenizer, store, "a", "de", 3)
+
+        assert store.num_cold == 1
+        assert [first, second] == generator.generate(
+            [GenerationRequest("abc", 4), GenerationRequest("abc" + first + "de", 3)]
+        )
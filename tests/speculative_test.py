@@ -0,0 +1,47 @@
+import pytest
+import torch
+
+from minimamba.generation.batch_generator import BatchGenerator, GenerationRequest
+from minimamba.generation.speculative import SpeculativeGenerator
+from minimamba.models.mini_mamba import MiniMamba
+
+REQUESTS = [
+    GenerationRequest("abc", 9),
+    GenerationRequest("k", 3),
+    GenerationRequest("hijkabcde", 1),
+    GenerationRequest("ajk", 12, ["ff"]),
+]
+
+
+class TestSpeculativeGenerator:
+    @pytest.mark.parametrize("num_draft_tokens", [1, 3, 8])
+    def test_matches_greedy_generation(
+        self, model_config, config_class, tokenizer, num_draft_tokens
+    ):
+        torch.manual_seed(0)
+        model = MiniMamba(model_config(config_class)).eval()
+        draft_model = MiniMamba(model_config(config_class)).eval()
+
+        generator = SpeculativeGenerator(
+            model, draft_model, tokenizer, num_draft_tokens, batch_size=2
+        )
+
+        assert generator.generate(REQUESTS) == BatchGenerator(model, tokenizer).generate(
+            REQUESTS
+        )
+        assert 0 <= generator.acceptance_rate <= 1
+
+    def test_same_draft_accepts_everything(self, model_config, config_class, tokenizer):
+        torch.manual_seed(0)
+        model = MiniMamba(model_config(config_class)).eval()
+
+        generator = SpeculativeGenerator(model, model, tokenizer, 4)
+
+        assert generator.generate(REQUESTS) == BatchGenerator(model, tokenizer).generate(
+            REQUESTS
+        )
+        assert generator.acceptance_rate == 1.0
+
+    def test_requires_draft_tokens(self, model, tokenizer):
+        with pytest.raises(ValueError):
+            SpeculativeGenerator(model, model, tokenizer, num_draft_tokens=0)
@@ -0,0 +1,46 @@
+import asyncio
+
+from minimamba.generation.batch_generator import BatchGenerator, GenerationRequest
+from minimamba.generation.streaming import astream_generate, stream_generate
+
+
+async def _collect(stream) -> list[str]:
+    return [piece async for piece in stream]
+
+
+class TestStreaming:
+    def test_pieces_match_batch_generation(self, model, tokenizer):
+        request = GenerationRequest("abc", 10)
+
+        pieces = list(stream_generate(model, tokenizer, request))
+
+        assert len(pieces) == 10
+        assert "".join(pieces) == BatchGenerator(model, tokenizer).generate([request])[0]
+
+    def test_stop_strings(self, model, tokenizer):
+        (completion,) = BatchGenerator(model, tokenizer).generate(
+            [GenerationRequest("kkd", 12)]
+        )
+        # A stop string that only matches in full, and one that never matches
+        stop = [completion[5:8], completion[2:4] + "x"]
+        request = GenerationRequest("kkd", 12, stop)
+
+        pieces = list(stream_generate(model, tokenizer, request))
+
+        assert "".join(pieces) == completion[: completion.find(stop[0])]
+        assert all(pieces)
+
+    def test_async_streams_interleave(self, model, tokenizer):
+        requests = [GenerationRequest("abc", 6), GenerationRequest("k", 9, ["j"])]
+
+        async def run() -> list[list[str]]:
+            return await asyncio.gather(
+                *[
+                    _collect(astream_generate(model, tokenizer, request))
+                    for request in requests
+                ]
+            )
+
+        completions = ["".join(pieces) for pieces in asyncio.run(run())]
+
+        assert completions == BatchGenerator(model, tokenizer).generate(requests)
@@ -0,0 +1,75 @@
+import argparse
+import time
+
+import torch
+
+from minimamba.models.mini_mamba import SelectiveStateSpaceModel
+
+SCAN_MODES = ["sequential", "parallel", "chunked", "recompute", "segsum", "fused"]
+
+
+def benchmark(
+    scan_mode: str,
+    seq_len: int,
+    batch_size: int,
+    working_dim: int,
+    state_dim: int,
+    chunk_size: int,
+    repeats: int,
+    backward: bool,
+    use_compile: bool,
+) -> float:
+    torch.manual_seed(0)
+    ssm = SelectiveStateSpaceModel(working_dim, state_dim, 16, scan_mode, chunk_size)
+    if use_compile:
+        ssm = torch.compile(ssm)
+    x = torch.randn(batch_size, seq_len, working_dim, requires_grad=backward)
+
+    timings = []
+    for _ in range(repeats + 1):
+        start = time.perf_counter()
+        if backward:
+            ssm(x).sum().backward()
+        else:
+            with torch.no_grad():
+                ssm(x)
+        timings.append(time.perf_counter() - start)
+
+    # The first run is a warm-up (and compilation)
+    return min(timings[1:])
+
+
+def main(args: argparse.Namespace) -> None:
+    print(f"{'T':>6}" + "".join(f"{mode:>12}" for mode in args.modes))
+    for seq_len in args.seq_lens:
+        timings = [
+            benchmark(
+                mode,
+                seq_len,
+                args.batch_size,
+                args.working_dim,
+                args.state_dim,
+                args.chunk_size,
+                args.repeats,
+                args.backward,
+                args.compile,
+            )
+            for mode in args.modes
+        ]
+        print(f"{seq_len:>6}" + "".join(f"{timing * 1e3:>10.1f}ms" for timing in timings))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Time the scan modes of SelectiveStateSpaceModel on this machine"
+    )
+    parser.add_argument("--modes", nargs="+", default=SCAN_MODES, choices=SCAN_MODES)
+    parser.add_argument("--seq-lens", nargs="+", type=int, default=[64, 256, 1024, 4096])
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--working-dim", type=int, default=256)
+    parser.add_argument("--state-dim", type=int, default=16)
+    parser.add_argument("--chunk-size", type=int, default=64)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--backward", action="store_true", help="time backward too")
+    parser.add_argument("--compile", action="store_true", help="use torch.compile")
+    main(parser.parse_args())
@@ -0,0 +1,55 @@
+import argparse
+import asyncio
+import time
+
+import aiohttp
+import numpy as np
+
+
+async def send_requests(
+    session: aiohttp.ClientSession,
+    url: str,
+    payload: dict,
+    num_requests: int,
+    semaphore: asyncio.Semaphore,
+) -> list[tuple[float, int]]:
+    async def send() -> tuple[float, int]:
+        async with semaphore:
+            start = time.perf_counter()
+            async with session.post(url, json=payload) as response:
+                response.raise_for_status()
+                result = await response.json()
+            return time.perf_counter() - start, result["num_tokens"]
+
+    return await asyncio.gather(*[send() for _ in range(num_requests)])
+
+
+async def main(args: argparse.Namespace) -> None:
+    payload = {"prompt": args.prompt, "max_new_tokens": args.max_new_tokens}
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async with aiohttp.ClientSession() as session:
+        start = time.perf_counter()
+        results = await send_requests(
+            session, args.url, payload, args.num_requests, semaphore
+        )
+        elapsed = time.perf_counter() - start
+
+    latencies = np.array([latency for latency, _ in results])
+    num_tokens = sum(tokens for _, tokens in results)
+    print(f"requests:   {len(results)} ({args.concurrency} concurrent)")
+    print(f"p50:        {np.percentile(latencies, 50) * 1e3:.1f}ms")
+    print(f"p99:        {np.percentile(latencies, 99) * 1e3:.1f}ms")
+    print(f"tokens/sec: {num_tokens / elapsed:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Send concurrent requests to the serve command and report latency"
+    )
+    parser.add_argument("--url", default="http://127.0.0.1:8080/generate")
+    parser.add_argument("--num-requests", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--prompt", default="ROMEO:")
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    asyncio.run(main(parser.parse_args()))